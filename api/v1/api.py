@@ -4,8 +4,10 @@ from api.v1.views import app_views
 from flask import Blueprint, jsonify
 from flask_cors import CORS
 from markupsafe import escape
+from werkzeug.exceptions import BadRequest
 from models import storage
 from models.user import User
+from services import ServiceError
 import os
 from dotenv import load_dotenv
 
@@ -21,8 +23,13 @@ def close_storage(e):
 
 @api.after_request
 def add_header(response):
-    """Adds headers to response"""
-    response.cache_control.no_store = True
+    """Adds headers to response, responses carrying an ETag
+    may be kept by the client but must be revalidated"""
+    if response.get_etag()[0]:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.no_store = True
     return response
 
 
@@ -34,8 +41,12 @@ def not_found(e):
 
 @api.errorhandler(400)
 def not_valid_json(e):
-    """Handles the not JSON error"""
-    return jsonify({'error': 'Not a JSON'}), 400
+    """Handles the not JSON error, and the bad requests
+    aborted with their own message"""
+    message = e.description
+    if message == BadRequest.description:
+        message = 'Not a JSON'
+    return jsonify({'error': message}), 400
 
 
 @api.errorhandler(403)
@@ -44,4 +55,10 @@ def not_valid_json(e):
     return jsonify({'error': 'Forbidden'}), 403
 
 
+@api.errorhandler(ServiceError)
+def service_error(e):
+    """Maps service errors to JSON error responses"""
+    return jsonify({'error': e.message}), e.status_code
+
+
 api.register_blueprint(app_views, url_prefix='/api/v1')
@@ -11,3 +11,5 @@ if app_views:
     from api.v1.views.staff import *
     from api.v1.views.users import *
     from api.v1.views.medical_records import *
+    from api.v1.views.search import *
+    from api.v1.views.appointments import *
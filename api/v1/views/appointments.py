@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""Handles API calls for the appointments model"""
+from api.v1.views import app_views
+from flask import jsonify, abort, request
+from markupsafe import escape
+from datetime import datetime
+from services import appointments, availability
+from utilities.decorators import staff_one_required
+from utilities.pagination import int_arg, page_args
+from utilities.conditional import (collection_etag, conditional_response,
+                                   object_validators)
+
+
+@app_views.route('/appointments', methods=['GET'], strict_slashes=False)
+@staff_one_required
+def get_appointments():
+    """Retrieves a page of appointments"""
+    limit, after = page_args()
+    data = appointments.list_appointments(limit, after)
+    etag = collection_etag(data['appointments'], data['next_cursor'])
+    return conditional_response(data, etag)
+
+
+@app_views.route('/appointments/<string:appointment_id>', methods=['GET'],
+                 strict_slashes=False)
+@staff_one_required
+def get_appointment(appointment_id):
+    """Retrieves one appointment"""
+    appointment_id = escape(appointment_id)
+    data = appointments.get_appointment(appointment_id)
+    return conditional_response(data, *object_validators(data))
+
+
+@app_views.route('/appointments', methods=['POST'], strict_slashes=False)
+@staff_one_required
+def create_appointment():
+    """Books an appointment, answers 409 when the staff
+    member is already booked at that time"""
+    if not request.is_json:
+        abort(400)
+    data = request.get_json()
+    if not data:
+        abort(400)
+    return jsonify(appointments.create_appointment(data)), 201
+
+
+@app_views.route('/appointments/<string:appointment_id>', methods=['PUT'],
+                 strict_slashes=False)
+@staff_one_required
+def move_appointment(appointment_id):
+    """Moves an appointment to another date, duration or staff member"""
+    appointment_id = escape(appointment_id)
+    if not request.is_json:
+        abort(400)
+    data = request.get_json()
+    if not data:
+        abort(400)
+    return jsonify(appointments.move_appointment(appointment_id, data)), 200
+
+
+@app_views.route('/appointments/<string:appointment_id>',
+                 methods=['DELETE'], strict_slashes=False)
+@staff_one_required
+def cancel_appointment(appointment_id):
+    """Cancels an appointment"""
+    appointment_id = escape(appointment_id)
+    appointments.cancel_appointment(appointment_id)
+    return jsonify({}), 200
+
+
+@app_views.route('/availability', methods=['GET'], strict_slashes=False)
+@staff_one_required
+def get_availability():
+    """Finds the earliest ?count= free slots of ?duration= minutes
+    with any staff member, or the ?staff_id= ones, between ?start=
+    and ?end= (ISO dates)"""
+    duration = int_arg('duration', 20)
+    count = int_arg('count', 5)
+    try:
+        start, end = [datetime.fromisoformat(request.args[arg])
+                      if request.args.get(arg) else None
+                      for arg in ('start', 'end')]
+    except ValueError:
+        abort(400, 'Invalid date')
+    staff_ids = [staff_id for arg in request.args.getlist('staff_id')
+                 for staff_id in arg.split(',') if staff_id] or None
+    return jsonify(availability.find_slots(duration, count, start, end,
+                                           staff_ids)), 200
@@ -1,9 +1,10 @@
 #!/usr/bin/python3
 """Landing view of the api"""
 from api.v1.views import app_views
-from flask import jsonify
+from datetime import datetime
+from flask import abort, jsonify, request
 from flask_login import current_user
-from models import storage
+from services import stats
 from utilities.decorators import (staff_one_required,
                                   staff_two_required, admin_required)
 
@@ -23,12 +24,19 @@ def get_status():
 @app_views.route('/stats', methods=['GET'], strict_slashes=False)
 @staff_one_required
 def get_stats():
-    """Gets the object stats"""
-    data = {
-        'patients': storage.count('Patient'),
-        'staff': storage.count('Staff'),
-        'medical_records': storage.count('MedicalRecord'),
-        'appointments': storage.count('Appointment'),
-        'users': storage.count('User')
-    }
-    return jsonify(data), 200
+    """Gets the object stats, optionally only counting
+    objects created since the passed ISO date"""
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            abort(400, 'Invalid since date')
+    return jsonify(stats.get_stats(since)), 200
+
+
+@app_views.route('/metrics/pool', methods=['GET'], strict_slashes=False)
+@admin_required
+def get_pool_metrics():
+    """Gets the live connection pool metrics of this process"""
+    return jsonify(stats.get_pool_metrics()), 200
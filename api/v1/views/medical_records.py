@@ -2,48 +2,54 @@
 """Handles API calls for the medical_records model"""
 from api.v1.views import app_views
 from flask import jsonify, abort, request
-from models import storage
 from markupsafe import escape
-from models.medical_record import MedicalRecord
-from models.user import User
-from models.staff import Staff
+from services import medical_records
 from utilities.decorators import (staff_one_required,
                                   staff_two_required, admin_required)
+from utilities.pagination import page_args
+from utilities.projection import fields_arg
+from utilities.conditional import (collection_etag, conditional_response,
+                                   object_validators)
+from utilities.streaming import stream_format, stream_response
 
 
-@app_views.route('/medical_records/<string:user_id>', methods=['GET'],
+@app_views.route('/medical_records/<string:rec_id>', methods=['GET'],
                  strict_slashes=False)
 @staff_two_required
-def get_medical_record_by_id(user_id):
-    """Retrieves medical record details"""
-    user_id = escape(user_id)
-    medical_record = storage.get_by_user_id(MedicalRecord, user_id)
-    if not medical_record:
-        abort(404)
-    return jsonify(medical_record.to_dict()), 200
+def get_medical_record_by_id(rec_id):
+    """Retrieves medical record details, only the ?fields=a,b
+    when passed"""
+    rec_id = escape(rec_id)
+    fields = fields_arg()
+    data = medical_records.get_medical_record(rec_id, fields)
+    return conditional_response(data, *object_validators(data, fields))
 
 
 @app_views.route('/medical_records', methods=['GET'], strict_slashes=False)
 @staff_two_required
 def get_medical_records():
-    """Retrieves all medical records"""
-    medical_records = storage.all(MedicalRecord)
-    medical_records = [medical_record.to_dict()
-                       for medical_record in medical_records.values()]
-    return jsonify(medical_records), 200
+    """Retrieves a page of medical records, or streams every
+    record when ?stream=json|ndjson is passed. ?fields=a,b
+    limits the fields read and sent"""
+    fmt = stream_format()
+    fields = fields_arg()
+    if fmt:
+        return stream_response(
+            medical_records.iter_medical_records(fields=fields), fmt)
+    limit, after = page_args()
+    data = medical_records.list_medical_records(limit, after, fields)
+    etag = collection_etag(data['medical_records'], data['next_cursor'],
+                           fields)
+    return conditional_response(data, etag)
 
 
-@app_views.route('/medical_records/<string:patient_id>', methods=['DELETE'],
+@app_views.route('/medical_records/<string:rec_id>', methods=['DELETE'],
                  strict_slashes=False)
 @staff_two_required
-def delete_medical_record(patient_id):
+def delete_medical_record(rec_id):
     """Deletes a medical record"""
-    patient_id = escape(patient_id)
-    medical_record = storage.get_by_user_id(MedicalRecord, patient_id)
-    if not medical_record:
-        abort(404)
-    storage.delete(medical_record)
-    storage.save()
+    rec_id = escape(rec_id)
+    medical_records.delete_medical_record(rec_id)
     return jsonify({}), 200
 
 
@@ -54,17 +60,7 @@ def create_medical_record():
     data = request.get_json()
     if not data:
         abort(400, 'Not a JSON')
-    if 'patient_id' not in data:
-        abort(400, 'Missing user_id')
-    if 'staff_id' not in data:
-        abort(400, 'Missing staff_id')
-    if 'diagnosis' not in data:
-        abort(400, 'Missing diagnosis')
-    if 'prescription' not in data:
-        abort(400, 'Missing prescription')
-    new_medical_record = MedicalRecord(**data)
-    new_medical_record.save()
-    return jsonify(new_medical_record.to_dict()), 201
+    return jsonify(medical_records.create_medical_record(data)), 201
 
 
 @app_views.route('/medical_records/<string:rec_id>', methods=['PUT'],
@@ -76,10 +72,4 @@ def update_medical_record(rec_id):
     if not data:
         abort(400, 'Not a JSON')
     rec_id = escape(rec_id)
-    medical_record = storage.get(MedicalRecord, rec_id)
-    if not medical_record:
-        abort(404)
-    for key, value in data.items():
-        setattr(medical_record, key, value)
-    medical_record.save()
-    return jsonify(medical_record.to_dict()), 200
+    return jsonify(medical_records.update_medical_record(rec_id, data)), 200
@@ -1,46 +1,91 @@
 #!/usr/bin/python3
 """Handles api CRUD for the patients model"""
 
+import io
 from api.v1.views import app_views
 from flask import jsonify, abort, request
-from models import storage
 from markupsafe import escape
-from models.patient import Patient
+from services import patient_import, patients
 from utilities.decorators import (staff_one_required,
                                   staff_two_required, admin_required)
+from utilities.pagination import int_arg, page_args
+from utilities.projection import fields_arg
+from utilities.query_metrics import query_budget
+from utilities.conditional import (collection_etag, conditional_response,
+                                   make_etag, object_validators)
+from utilities.streaming import stream_format, stream_response
 
 
 @app_views.route('/patients', methods=['GET'], strict_slashes=False)
 @staff_one_required
+@query_budget(5)
 def get_patients():
-    """Retrives and serves all patients"""
-    data = [o.to_dict() for o in storage.all('Patient').values()]
-    return jsonify(data), 200
+    """Retrives and serves a page of patients, or streams
+    every patient when ?stream=json|ndjson is passed. Every
+    patient gets their ?latest_records=N latest medical records
+    and, with ?counts=1, their record and appointment counts.
+    ?fields=a,b limits the patient fields read and sent"""
+    fmt = stream_format()
+    fields = fields_arg()
+    if fmt:
+        return stream_response(patients.iter_patients(fields=fields), fmt)
+    limit, after = page_args()
+    latest_records = int_arg('latest_records', 0)
+    counts = request.args.get('counts', '').lower() in ('1', 'true')
+    data = patients.list_patients(limit, after, latest_records, counts,
+                                  fields)
+    records = [record for patient in data['patients']
+               for record in patient.get('latest_medical_records', [])]
+    etag = collection_etag(data['patients'] + records, data['next_cursor'],
+                           fields,
+                           *[(patient.get('medical_record_count'),
+                              patient.get('appointment_count'))
+                             for patient in data['patients']])
+    return conditional_response(data, etag)
 
 
 @app_views.route('/patients/<string:patient_id>',
                  methods=['GET'], strict_slashes=False)
 @staff_one_required
 def get_patient(patient_id):
-    """Retrieves one patient from db"""
+    """Retrieves one patient from db, only the ?fields=a,b
+    when passed"""
     p_id = escape(patient_id)
-    patient = storage.get('Patient', p_id)
-    if patient is None:
-        abort(404)
-    return jsonify(patient.to_dict()), 200
+    fields = fields_arg()
+    data = patients.get_patient(p_id, fields)
+    return conditional_response(data, *object_validators(data, fields))
 
 
 @app_views.route('/patients/<string:patient_id>/medical_records',
                  methods=['GET'], strict_slashes=False)
 @staff_one_required
+@query_budget(5)
 def get_patient_medical_records(patient_id):
     """Retrieves one patient from db and their records"""
     p_id = escape(patient_id)
-    patient = storage.get('Patient', p_id)
-    if patient is None:
-        abort(404)
-    medical_records = [record.to_dict() for record in patient.medical_records]
-    return jsonify({'medical_records': medical_records}), 200
+    etag = make_etag(*patients.get_medical_records_version(p_id))
+    return conditional_response(
+        lambda: patients.get_patient_medical_records(p_id), etag)
+
+
+@app_views.route('/patients/<string:patient_id>/timeline',
+                 methods=['GET'], strict_slashes=False)
+@staff_one_required
+@query_budget(3)
+def get_patient_timeline(patient_id):
+    """Retrieves one patient with a page of their medical records
+    and appointments in time order, ?order=desc for the latest
+    first"""
+    p_id = escape(patient_id)
+    limit, after = page_args()
+    order = request.args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        abort(400, 'Invalid order')
+    data = patients.get_patient_timeline(p_id, limit, after,
+                                         order == 'desc')
+    etag = collection_etag(data['timeline'] + [data['patient']],
+                           data['next_cursor'])
+    return conditional_response(data, etag)
 
 
 @app_views.route('/patients/<string:patient_id>', methods=['DELETE'],
@@ -49,11 +94,7 @@ def get_patient_medical_records(patient_id):
 def delete_patient(patient_id):
     """Deletes a patient from storage"""
     p_id = escape(patient_id)
-    patient = storage.get('Patient', p_id)
-    if patient is None:
-        abort(404)
-    storage.delete(patient)
-    storage.save()
+    patients.delete_patient(p_id)
     return jsonify({}), 200
 
 
@@ -61,24 +102,24 @@ def delete_patient(patient_id):
 @staff_one_required
 def create_patient():
     """Creates a patient"""
-    print("creating patient")
     if not request.is_json:
         abort(400)
     data = request.get_json()
     if not data:
         abort(400)
-    required_fields = ['fullname', 'id_number', 'dob', 'sex', 'address']
-    missing_fields = [field for field in required_fields if field not in data]
-    if missing_fields:
-        return jsonify(
-            {"error": "Missing fields: " + ", ".join(missing_fields)}
-            ), 400
-    try:
-        new_patient = Patient(**data)
-        new_patient.save()
-        return jsonify(new_patient.to_dict()), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+    return jsonify(patients.create_patient(data)), 201
+
+
+@app_views.route('/patients/import', methods=['POST'], strict_slashes=False)
+@staff_one_required
+def import_patients():
+    """Bulk imports patients from a JSON array, NDJSON or CSV
+    body and reports the rows that were rejected"""
+    fmt = patient_import.FORMATS.get(request.mimetype)
+    batch_size = int_arg('batch_size', patient_import.BATCH_SIZE)
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    return jsonify(patient_import.import_patients(stream, fmt,
+                                                  batch_size)), 200
 
 
 @app_views.route('/patients/<string:patient_id>', methods=['PUT'],
@@ -87,17 +128,9 @@ def create_patient():
 def update_patient(patient_id):
     """Updates a patient's details"""
     p_id = escape(patient_id)
-    patient = storage.get(Patient, p_id)
-    if not patient:
-        abort(404)
     if not request.is_json:
         abort(400)
     data = request.get_json()
     if not data:
         abort(400)
-    for k, v in data.items():
-        ignore = ['id', 'created_at', 'updated_at']
-        if k not in ignore:
-            setattr(patient, k, v)
-    patient.save() 
-    return jsonify(patient.to_dict()), 200
+    return jsonify(patients.update_patient(p_id, data)), 200
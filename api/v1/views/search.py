@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+"""Handles API calls for full text search"""
+from api.v1.views import app_views
+from flask import jsonify, request
+from services import search
+from utilities.decorators import staff_one_required, staff_two_required
+from utilities.pagination import int_arg
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+@app_views.route('/search/medical_records', methods=['GET'],
+                 strict_slashes=False)
+@staff_two_required
+def search_medical_records():
+    """Searches medical record diagnosis and prescription text,
+    ?q= terms are prefix matched and all must match"""
+    limit = min(max(int_arg('limit', DEFAULT_LIMIT), 1), MAX_LIMIT)
+    data = search.search_medical_records(request.args.get('q', ''), limit)
+    return jsonify(data)
+
+
+@app_views.route('/search/patients', methods=['GET'], strict_slashes=False)
+@staff_one_required
+def search_patients():
+    """Searches patients by approximate ?name=, best match first,
+    optionally filtered by ?dob=YYYY-MM-DD and ?sex="""
+    limit = min(max(int_arg('limit', DEFAULT_LIMIT), 1), MAX_LIMIT)
+    data = search.search_patients(request.args.get('name', ''),
+                                  request.args.get('dob'),
+                                  request.args.get('sex'), limit)
+    return jsonify(data)
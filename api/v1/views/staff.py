@@ -1,35 +1,52 @@
 #!/usr/python3
 """Handles API calls for the staff model"""
+from datetime import datetime
 from api.v1.views import app_views
 from flask import jsonify, abort, request
 from flask_login import login_required
-from models import storage
 from markupsafe import escape
-from models.staff import Staff
-from models.user import User
+from services import appointments
+from services import staff as staff_service
 from utilities.decorators import (staff_one_required,
                                   staff_two_required, admin_required)
+from utilities.pagination import page_args
+from utilities.projection import fields_arg
+from utilities.conditional import (collection_etag, conditional_response,
+                                   object_validators)
+from utilities.streaming import stream_format, stream_response
 
 
 @app_views.route('/staff/<string:user_id>', methods=['GET'],
                  strict_slashes=False)
 @staff_one_required
 def get_staff_by_id(user_id):
-    """Retrieves staff member's details"""
+    """Retrieves staff member's details, only the ?fields=a,b
+    when passed"""
     user_id = escape(user_id)
-    staff = storage.get_by_user_id(Staff, user_id)
-    if not staff:
-        abort(404)
-    return jsonify(staff.to_dict()), 200
+    fields = fields_arg()
+    data = staff_service.get_staff_by_user_id(user_id, fields)
+    return conditional_response(data, *object_validators(data, fields))
 
 
 @app_views.route('/staff', methods=['GET'], strict_slashes=False)
 @staff_one_required
 def get_staff():
-    """Retrieves all staff members"""
-    staff = storage.all(Staff)
-    staff = [staff.to_dict() for staff in staff.values()]
-    return jsonify(staff), 200
+    """Retrieves a page of staff members, with their appointment
+    counts on ?counts=1, or streams every member when
+    ?stream=json|ndjson is passed. ?fields=a,b limits the
+    fields read and sent"""
+    fmt = stream_format()
+    fields = fields_arg()
+    if fmt:
+        return stream_response(staff_service.iter_staff(fields=fields),
+                               fmt)
+    limit, after = page_args()
+    counts = request.args.get('counts', '').lower() in ('1', 'true')
+    data = staff_service.list_staff(limit, after, counts, fields)
+    etag = collection_etag(data['staff'], data['next_cursor'], fields,
+                           *[member.get('appointment_count')
+                             for member in data['staff']])
+    return conditional_response(data, etag)
 
 
 @app_views.route('/staff/<string:user_id>', methods=['DELETE'],
@@ -38,11 +55,7 @@ def get_staff():
 def delete_staff(user_id):
     """Deletes a staff member"""
     user_id = escape(user_id)
-    staff = storage.get_by_user_id(Staff, user_id)
-    if not staff:
-        abort(404)
-    storage.delete(staff)
-    storage.save()
+    staff_service.delete_staff(user_id)
     return jsonify({}), 200
 
 
@@ -53,30 +66,7 @@ def create_staff():
     data = request.get_json()
     if not data:
         abort(400, 'Not a JSON')
-    if 'user_id' not in data:
-        abort(400, 'Missing user_id')
-    if 'fullname' not in data:
-        abort(400, 'Missing fullname')
-    if 'id_number' not in data:
-        abort(400, 'Missing id_number')
-    if 'dob' not in data:
-        abort(400, 'Missing dob')
-    if 'sex' not in data:
-        abort(400, 'Missing sex')
-    if 'address' not in data:
-        abort(400, 'Missing address')
-    if 'email' not in data:
-        abort(400, 'Missing email')
-    if 'cell' not in data:
-        abort(400, 'Missing cell')
-    user_id = escape(data['user_id'])
-    user = storage.get(User, user_id)
-    if not user:
-        abort(404)
-    new_staff = Staff(**data)
-    new_staff.save()
-
-    return jsonify(new_staff.to_dict()), 201
+    return jsonify(staff_service.create_staff(data)), 201
 
 
 @app_views.route('/staff/<string:user_id>', methods=['PUT'],
@@ -85,31 +75,24 @@ def create_staff():
 def update_staff(user_id):
     """Updates a staff member"""
     user_id = escape(user_id)
-    staff = storage.get(Staff, user_id)
-    if not staff:
-        abort(404)
     data = request.get_json()
     if not data:
         abort(400, 'Not a JSON')
-    for key, value in data.items():
-        if key not in ['fullname', 'id_number', 'dob',
-                       'sex', 'address', 'email', 'cell']:
-            abort(400, 'Invalid field')
-        setattr(staff, key, value)
-    storage.save()
-
-    return jsonify(staff.to_dict()), 200
+    return jsonify(staff_service.update_staff(user_id, data)), 200
 
 
 @app_views.route('/staff/<string:user_id>/appointments', methods=['GET'],
                  strict_slashes=False)
 @staff_one_required
 def get_staff_appointments(user_id):
-    """Retrieves all appointments for a staff member"""
+    """Retrieves the appointments of a staff member, only the ones
+    starting between ?start= and ?end= (ISO dates) when passed"""
     user_id = escape(user_id)
-    staff = storage.get_by_user_id(Staff, user_id)
-    if not staff:
-        abort(404)
-    appointments = storage.get_appointments(staff)
-    appointments = [appointment.to_dict() for appointment in appointments]
-    return jsonify(appointments), 200
+    try:
+        start, end = [datetime.fromisoformat(request.args[arg])
+                      if request.args.get(arg) else None
+                      for arg in ('start', 'end')]
+    except ValueError:
+        abort(400, 'Invalid date')
+    return jsonify(appointments.get_staff_appointments(user_id, start,
+                                                       end)), 200
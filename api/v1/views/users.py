@@ -2,33 +2,43 @@
 """Handles API calls for the user model"""
 from api.v1.views import app_views
 from flask import jsonify, abort, request
-from models import storage
 from markupsafe import escape
 from flask_login import login_required
-from models.user import User
+from services import users
 from utilities.decorators import (staff_one_required,
                                   staff_two_required, admin_required)
+from utilities.pagination import page_args
+from utilities.projection import fields_arg
+from utilities.conditional import (collection_etag, conditional_response,
+                                   object_validators)
+from utilities.streaming import stream_format, stream_response
 
 
 @app_views.route('/users/<string:user_id>', methods=['GET'],
                  strict_slashes=False)
 @login_required
 def get_user_by_id(user_id):
-    """Retrieves user's details"""
+    """Retrieves user's details, only the ?fields=a,b when passed"""
     user_id = escape(user_id)
-    user = storage.get_by_user_id(User, user_id)
-    if not user:
-        abort(404)
-    return jsonify(user.to_dict()), 200
+    fields = fields_arg()
+    data = users.get_user(user_id, fields)
+    return conditional_response(data, *object_validators(data, fields))
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 @admin_required
 def get_users():
-    """Retrieves all users"""
-    users = storage.all(User)
-    users = [user.to_dict() for user in users.values()]
-    return jsonify(users), 200
+    """Retrieves a page of users, or streams every user
+    when ?stream=json|ndjson is passed. ?fields=a,b limits
+    the fields read and sent"""
+    fmt = stream_format()
+    fields = fields_arg()
+    if fmt:
+        return stream_response(users.iter_users(fields=fields), fmt)
+    limit, after = page_args()
+    data = users.list_users(limit, after, fields)
+    etag = collection_etag(data['users'], data['next_cursor'], fields)
+    return conditional_response(data, etag)
 
 
 @app_views.route('/users/<string:user_id>', methods=['DELETE'],
@@ -36,13 +46,8 @@ def get_users():
 @admin_required
 def delete_user(user_id):
     """Deletes a user"""
-    print('Deleting user')
     user_id = escape(user_id)
-    user = storage.get_by_user_id(User, user_id)
-    if not user:
-        abort(404)
-    storage.delete(user)
-    storage.save()
+    users.delete_user(user_id)
     return jsonify({}), 200
 
 
@@ -51,20 +56,8 @@ def create_user():
     """Creates a user"""
     data = request.get_json()
     if not data:
-        print('No JSON received')
         abort(400, 'Not a JSON')
-    if 'username' not in data:
-        abort(400, 'Missing username')
-    if 'email' not in data:
-        abort(400, 'Missing email')
-    if 'password' not in data:
-        abort(400, 'Missing password')
-    new_user = User(username=data['username'], email=data['email'])
-    new_user.set_password(data['password'])
-    new_user.verification_token = new_user.generate_verification_token()
-    storage.new(new_user)
-    storage.save()
-    return jsonify(new_user.to_dict()), 201
+    return jsonify(users.create_user(data)), 201
 
 
 @app_views.route('/users/<string:user_id>', methods=['PUT'],
@@ -76,14 +69,4 @@ def update_user(user_id):
     if not data:
         abort(400, 'Not a JSON')
     user_id = escape(user_id)
-    user = storage.get_by_user_id(User, user_id)
-    if not user:
-        abort(404)
-    if 'username' in data:
-        user.username = data['username']
-    if 'email' in data:
-        user.email = data['email']
-    if 'password_hash' in data:
-        user.password_hash = data['password_hash']
-    storage.save()
-    return jsonify(user.to_dict()), 200
+    return jsonify(users.update_user(user_id, data)), 200
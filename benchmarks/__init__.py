@@ -0,0 +1,2 @@
+#!/usr/bin/python3
+"""Performance benchmarks for the project"""
@@ -0,0 +1,265 @@
+#!/usr/bin/python3
+"""
+    Drives the Flask test client against the main API endpoints and
+    page routes, reads and the create, update and booking writes,
+    over a synthetic dataset on a local SQLite db, and reports
+    latency percentiles, throughput, and the peak and growth of the
+    resident set size per endpoint. The peak is sampled on a thread
+    while the endpoint runs, ru_maxrss only knows the process peak
+
+    Usage: python -m benchmarks.endpoints [--patients N] [--staff N]
+           [--requests N] [--db PATH] [--output FILE]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def percentile(timings, fraction):
+    """Returns the nearest rank percentile of sorted timings"""
+    return timings[max(int(round(fraction * len(timings))) - 1, 0)]
+
+
+def rss_kb():
+    """Returns the current resident set size of the process in
+    KiB, None where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+class RssSampler:
+    """Samples the resident set size every interval seconds on a
+    thread while a block runs and keeps the peak"""
+
+    def __init__(self, interval=0.001):
+        """Creates a stopped sampler"""
+        self.interval = interval
+        self.start = self.end = self.peak = None
+        self.__stopping = threading.Event()
+        self.__thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        """Starts sampling"""
+        self.start = self.peak = rss_kb()
+        if self.start is not None:
+            self.__thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stops sampling and takes a last sample"""
+        self.__stopping.set()
+        if self.__thread.is_alive():
+            self.__thread.join()
+        self.end = rss_kb()
+        if self.end is not None:
+            self.peak = max(self.peak, self.end)
+
+    def _sample(self):
+        """Keeps the highest sample until stopped"""
+        while not self.__stopping.wait(self.interval):
+            self.peak = max(self.peak, rss_kb() or 0)
+
+
+def writes(data, rng):
+    """Returns the (name, method, request generator) of the write
+    flows, every request creates new rows or slots"""
+    patient = lambda: rng.choice(data['patients'])
+    serial = itertools.count()
+    slots = itertools.count()
+    first_slot = datetime.combine(
+        datetime.now().date() + timedelta(days=365), datetime.min.time())
+
+    def new_patient():
+        """Returns a patient with a fresh ID number"""
+        return {'fullname': 'Bench Patient {}'.format(next(serial)),
+                'id_number': str(9000000000000 + next(serial)),
+                'dob': '1980-01-01', 'sex': 'Female',
+                'address': '1 Benchmark Road'}
+
+    def new_record():
+        """Returns a medical record of a random patient"""
+        return {'patient_id': patient()['id'],
+                'staff_id': rng.choice(data['staff'])['id'],
+                'diagnosis': 'Acute bronchitis',
+                'prescription': 'Rest and fluids'}
+
+    def new_appointment():
+        """Returns an appointment in the next free slot, a year out
+        so it never meets the fixture appointments"""
+        slot = next(slots)
+        staff = data['staff'][slot % len(data['staff'])]
+        start = first_slot + timedelta(
+            minutes=30 * (slot // len(data['staff'])))
+        return {'patient_id': patient()['id'], 'staff_id': staff['id'],
+                'date': start.isoformat(), 'duration': 20}
+
+    return [
+        ('api.patients.create', 'POST',
+         lambda: ('/api/v1/patients', new_patient())),
+        ('api.patients.update', 'PUT',
+         lambda: ('/api/v1/patients/{}'.format(patient()['id']),
+                  {'address': '{} Benchmark Road'.format(next(serial))})),
+        ('api.medical_records.create', 'POST',
+         lambda: ('/api/v1/medical_records', new_record())),
+        ('api.appointments.create', 'POST',
+         lambda: ('/api/v1/appointments', new_appointment())),
+    ]
+
+
+def endpoints(data, rng):
+    """Returns the (name, method, request generator) of every
+    endpoint benchmarked, a generator returns the path and the
+    JSON body"""
+    patient = lambda: rng.choice(data['patients'])
+    staff = lambda: rng.choice(data['staff'])
+    reads = [
+        ('api.patients.page', lambda: '/api/v1/patients?limit=50'),
+        ('api.patients.get',
+         lambda: '/api/v1/patients/{}'.format(patient()['id'])),
+        ('api.patients.medical_records',
+         lambda: '/api/v1/patients/{}/medical_records'.format(
+             patient()['id'])),
+        ('api.patients.timeline',
+         lambda: '/api/v1/patients/{}/timeline?limit=100'.format(
+             patient()['id'])),
+        ('api.medical_records.page',
+         lambda: '/api/v1/medical_records?limit=50'),
+        ('api.staff.page', lambda: '/api/v1/staff?limit=50'),
+        ('api.staff.appointments',
+         lambda: '/api/v1/staff/{}/appointments'.format(staff()['user_id'])),
+        ('api.appointments.page', lambda: '/api/v1/appointments?limit=50'),
+        ('api.availability',
+         lambda: '/api/v1/availability?duration=20&count=5'),
+        ('api.stats', lambda: '/api/v1/stats'),
+        ('api.search.patients',
+         lambda: '/api/v1/search/patients?name={}'.format(
+             patient()['fullname'][:-1])),
+        ('api.search.medical_records',
+         lambda: '/api/v1/search/medical_records?q=bronch'),
+        ('page.staff.dashboard', lambda: '/staff/'),
+        ('page.staff.view_patient',
+         lambda: '/staff/view_patient/{}'.format(patient()['id'])),
+        ('page.admin.dashboard', lambda: '/admin/'),
+    ]
+    return [(name, 'GET', lambda url=url: (url(), None))
+            for name, url in reads] + writes(data, rng)
+
+
+def run(client, method, request, requests, warmup):
+    """Sends the requests an endpoint generator returns and
+    returns the measurements"""
+    for _ in range(warmup):
+        path, body = request()
+        client.open(path, method=method, json=body)
+    timings = []
+    errors = 0
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        for _ in range(requests):
+            path, body = request()
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+        elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'throughput_rps': round(requests / elapsed, 1),
+        'peak_rss_kb': rss.peak,
+        'rss_growth_kb': (None if rss.end is None
+                          else rss.end - rss.start)
+    }
+
+
+def benchmark(args, workdir):
+    """Builds the dataset in workdir, runs the benchmark and
+    returns the report"""
+    path = args.db or os.path.join(workdir, 'bench.db')
+    if os.path.exists(path):
+        os.remove(path)
+    # The storage reads its settings when models is first imported
+    os.environ['DB_ENGINE'] = 'sqlite'
+    os.environ['DB_PATH'] = path
+    os.environ['MAIL_TRANSPORT'] = 'stub'
+    os.environ['MAIL_QUEUE_PATH'] = os.path.join(workdir, 'mail.db')
+    os.environ.setdefault('MAIN_APP_KEY', 'benchmark')
+    from benchmarks import fixture
+    from models import storage
+    from services import search
+
+    started = time.perf_counter()
+    data = fixture.build(args.patients, args.staff, args.records,
+                         args.appointments, args.seed)
+    fixture.load(storage.engine, data)
+    search.rebuild()
+    storage.close()
+    setup_s = time.perf_counter() - started
+
+    from main_app.app import app
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = data['users'][0]['id']
+        session['_fresh'] = True
+
+    rng = random.Random(args.seed)
+    selected = args.only.split(',') if args.only else None
+    results = {}
+    for name, method, request in endpoints(data, rng):
+        if selected and name not in selected:
+            continue
+        results[name] = run(client, method, request, args.requests,
+                            args.warmup)
+
+    return {
+        'dataset': {name: len(rows) for name, rows in data.items()},
+        'seed': args.seed,
+        'setup_s': round(setup_s, 2),
+        'python': sys.version.split()[0],
+        'endpoints': results
+    }
+
+
+def main():
+    """Runs the benchmark and writes the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--staff', type=int, default=50)
+    parser.add_argument('--records', type=int, default=3)
+    parser.add_argument('--appointments', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--db', help='SQLite file, a temporary one '
+                                     'by default')
+    parser.add_argument('--only', help='Comma separated endpoint names')
+    parser.add_argument('--output', help='Write the JSON there too')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='hpfm-bench-') as workdir:
+        report = json.dumps(benchmark(args, workdir), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
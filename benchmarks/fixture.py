@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+"""
+    Synthetic hospital dataset for the benchmarks
+
+    Rows are generated from a seeded random generator, so the same
+    arguments always produce the same dataset (dates are relative to
+    the current day), and inserted with core executemany statements.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from models.base_model import Base
+
+FIRST_NAMES = ['John', 'Mary', 'Thabo', 'Sipho', 'Lerato', 'Anna', 'Peter',
+               'Nomsa', 'James', 'Zanele', 'Ayanda', 'Pieter', 'Fatima']
+LAST_NAMES = ['Dlamini', 'Nkosi', 'Botha', 'Naidoo', 'Mokoena', 'Smith',
+              'Khumalo', 'van der Merwe', 'Mahlangu', 'Pillay', 'Ndlovu']
+DIAGNOSES = ['Acute bronchitis', 'Hypertension', 'Type 2 diabetes',
+             'Migraine', 'Sprained ankle', 'Influenza', 'Asthma',
+             'Tuberculosis follow up', 'Gastroenteritis', 'Otitis media']
+PRESCRIPTIONS = ['Amoxicillin 500mg', 'Paracetamol 1g', 'Metformin 850mg',
+                 'Salbutamol inhaler', 'Ibuprofen 400mg', 'Amlodipine 5mg',
+                 'Oral rehydration salts', 'Rest and fluids']
+PASSWORD = 'Bench-password-1'
+
+
+def _uuid(rng):
+    """Returns a uuid4 string drawn from rng"""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def build(patients=10000, staff=50, records=3, appointments=1, seed=1):
+    """Returns the rows of a dataset keyed by table name, each
+    patient gets `records` medical records and `appointments`
+    upcoming appointments"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1),
+                                datetime.min.time())
+    password_hash = generate_password_hash(PASSWORD)
+    data = {'users': [], 'staff': [], 'patients': [],
+            'medical_records': [], 'appointments': []}
+    for i in range(staff):
+        user_id = _uuid(rng)
+        data['users'].append({
+            'id': user_id, 'created_at': now, 'updated_at': now,
+            'username': 'staff{}'.format(i),
+            'email': 'staff{}@example.com'.format(i),
+            'password_hash': password_hash,
+            'role': 'admin' if i == 0 else 'staff_two',
+            'verified': True, 'verification_token': uuid.UUID(
+                int=rng.getrandbits(128)).hex})
+        data['staff'].append({
+            'id': _uuid(rng), 'created_at': now, 'updated_at': now,
+            'fullname': '{} {}'.format(rng.choice(FIRST_NAMES),
+                                       rng.choice(LAST_NAMES)),
+            'id_number': str(8000000000000 + i), 'dob': datetime(1980, 1, 1),
+            'sex': rng.choice(['Male', 'Female']), 'address': 'Ward',
+            'email': 'staff{}@example.com'.format(i), 'cell': '0800000000',
+            'user_id': user_id})
+    for i in range(patients):
+        patient_id = _uuid(rng)
+        created = now - timedelta(minutes=i)
+        data['patients'].append({
+            'id': patient_id, 'created_at': created, 'updated_at': created,
+            'fullname': '{} {}'.format(rng.choice(FIRST_NAMES),
+                                       rng.choice(LAST_NAMES)),
+            'id_number': str(i).zfill(13),
+            'dob': datetime(1940, 1, 1) + timedelta(days=rng.randrange(30000)),
+            'sex': rng.choice(['Male', 'Female']), 'address': 'Street'})
+        for _ in range(records):
+            data['medical_records'].append({
+                'id': _uuid(rng), 'created_at': created,
+                'updated_at': created, 'patient_id': patient_id,
+                'staff_id': rng.choice(data['staff'])['id'],
+                'diagnosis': rng.choice(DIAGNOSES),
+                'prescription': rng.choice(PRESCRIPTIONS)})
+        for _ in range(appointments):
+            data['appointments'].append({
+                'id': _uuid(rng), 'created_at': created,
+                'updated_at': created, 'patient_id': patient_id,
+                'staff_id': rng.choice(data['staff'])['id'],
+                'date': tomorrow + timedelta(days=rng.randrange(14),
+                                             hours=8 + rng.randrange(9)),
+                'duration': 30})
+    return data
+
+
+def load(engine, data, chunk_size=5000):
+    """Creates the schema and inserts the dataset"""
+    Base.metadata.create_all(engine)
+    tables = Base.metadata.tables
+    with engine.begin() as connection:
+        for name in ['users', 'staff', 'patients', 'medical_records',
+                     'appointments']:
+            rows = data[name]
+            for start in range(0, len(rows), chunk_size):
+                connection.execute(tables[name].insert(),
+                                   rows[start:start + chunk_size])
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+    Measures hot lookup latency before and after the
+    secondary indexes of migration 1 are added
+
+    Usage: python -m benchmarks.lookup_indexes [--url URL]
+           [--patients N] [--runs N]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from sqlalchemy import create_engine, inspect, text
+from benchmarks import fixture
+from models.base_model import Base
+from models.engine import migrations
+
+
+def lookups(users, staff, patients):
+    """Returns the named lookup statements with their parameter
+    generators"""
+    return {
+        'patient_by_id_number': (
+            'SELECT * FROM patients WHERE id_number = :v',
+            lambda: random.choice(patients)['id_number']),
+        'staff_by_user_id': (
+            'SELECT * FROM staff WHERE user_id = :v',
+            lambda: random.choice(users)['id']),
+        'records_by_patient': (
+            'SELECT * FROM medical_records WHERE patient_id = :v '
+            'ORDER BY created_at',
+            lambda: random.choice(patients)['id']),
+        'appointments_by_staff': (
+            'SELECT * FROM appointments WHERE staff_id = :v '
+            'ORDER BY date LIMIT 20',
+            lambda: random.choice(staff)['id']),
+        'user_by_verification_token': (
+            'SELECT * FROM users WHERE verification_token = :v',
+            lambda: random.choice(users)['verification_token']),
+    }
+
+
+def measure(engine, queries, runs):
+    """Times every lookup and returns p50/p95 latencies in ms"""
+    results = {}
+    with engine.connect() as connection:
+        for name, (sql, param) in queries.items():
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                connection.execute(text(sql), {'v': param()}).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            results[name] = {
+                'p50_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3)
+            }
+    return results
+
+
+def main():
+    """Runs the benchmark and prints the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--url', default='sqlite://')
+    parser.add_argument('--patients', type=int, default=20000)
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    data = fixture.build(args.patients, staff=max(args.patients // 100, 1))
+    fixture.load(engine, data)
+    # Start from a schema without the secondary indexes
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                names = [ix['name'] for ix in
+                         inspector.get_indexes(table.name)]
+                if index.name in names:
+                    index.drop(connection)
+    queries = lookups(data['users'], data['staff'], data['patients'])
+    before = measure(engine, queries, args.runs)
+    with engine.begin() as connection:
+        migrations.add_lookup_indexes(connection)
+    after = measure(engine, queries, args.runs)
+    print(json.dumps({'url': engine.url.render_as_string(),
+                      'patients': args.patients,
+                      'before': before, 'after': after}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+"""
+    Measures password check throughput against the number of
+    hashing workers, for thread and process pools
+
+    Usage: python -m benchmarks.password_hashing [--logins N]
+           [--method METHOD] [--kinds thread,process]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+from utilities.hashing import PASSWORD_HASH_METHOD, HashExecutor
+
+
+def throughput(kind, workers, pwhash, logins):
+    """Runs logins concurrent password checks and returns
+    how many completed per second"""
+    executor = HashExecutor(kind, workers, queue=logins, timeout=None)
+    # Warm the pool up so process start up isn't measured
+    executor.run(check_password_hash, pwhash, 'secret')
+    with ThreadPoolExecutor(logins) as clients:
+        start = time.perf_counter()
+        results = list(clients.map(
+            lambda _: executor.run(check_password_hash, pwhash, 'secret'),
+            range(logins)))
+        elapsed = time.perf_counter() - start
+    executor.shutdown()
+    assert all(results)
+    return round(logins / elapsed, 2)
+
+
+def main():
+    """Runs the benchmark and prints the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--method', default=PASSWORD_HASH_METHOD)
+    parser.add_argument('--kinds', default='thread,process')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    pwhash = generate_password_hash('secret', args.method)
+    results = {kind: {str(workers): throughput(kind, workers, pwhash,
+                                               args.logins)
+                      for workers in counts}
+               for kind in args.kinds.split(',')}
+    print(json.dumps({'method': args.method, 'cores': cores,
+                      'logins': args.logins,
+                      'logins_per_second': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
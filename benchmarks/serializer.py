@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""
+    Compares the former __dict__ based to_dict with the column
+    based serializer, on ORM instances and on raw row tuples
+
+    Usage: python -m benchmarks.serializer [--objects N] [--repeat N]
+"""
+import argparse
+import json
+import timeit
+import uuid
+from datetime import datetime
+from models.patient import Patient
+from models.serializer import serializer_for
+
+
+def legacy_to_dict(obj):
+    """The to_dict implementation the serializer replaced"""
+    obj_dict = obj.__dict__.copy()
+    if 'created_at' in obj_dict:
+        obj_dict['created_at'] = obj_dict['created_at'].strftime(
+            "%Y-%m-%d %H:%M:%S")
+    if 'updated_at' in obj_dict:
+        obj_dict['updated_at'] = obj_dict['updated_at'].strftime(
+            "%Y-%m-%d %H:%M:%S")
+    obj_dict['__class__'] = obj.__class__.__name__
+    if '_sa_instance_state' in obj_dict:
+        del obj_dict['_sa_instance_state']
+    return obj_dict
+
+
+def main():
+    """Runs the benchmark and prints the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--objects', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.now()
+    patients = [Patient(id=str(uuid.uuid4()), created_at=now,
+                        updated_at=now, fullname='Patient {}'.format(i),
+                        id_number=str(i).zfill(13),
+                        dob=datetime(1990, 1, 1), sex='Male',
+                        address='Street', email=None, cell=None)
+                for i in range(args.objects)]
+    serializer = serializer_for(Patient)
+    rows = [tuple(getattr(p, field) for field in serializer.fields)
+            for p in patients]
+    assert legacy_to_dict(patients[0]) == serializer.dump(patients[0])
+
+    cases = {
+        'legacy_to_dict': lambda: [legacy_to_dict(p) for p in patients],
+        'serializer_dump': lambda: [serializer.dump(p) for p in patients],
+        'serializer_dump_row': lambda: [serializer.dump_row(r)
+                                        for r in rows],
+    }
+    results = {}
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+        results[name] = {'total_ms': round(best * 1000, 2),
+                         'per_object_us': round(best / args.objects * 1e6, 3)}
+    print(json.dumps({'objects': args.objects, 'results': results},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+"""
+    Measures the cold start of a worker: every run is a fresh
+    interpreter importing models and the app, serving its first
+    request and running its first query against a local SQLite db.
+    Reports the median, min and max of each phase and whether the
+    db was touched at import time
+
+    Usage: python -m benchmarks.startup [--runs N] [--output FILE]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = '''
+import json, os, time
+started = time.perf_counter()
+from models import storage
+models_done = time.perf_counter()
+touched = os.path.exists(os.environ['DB_PATH'])
+from main_app.app import app
+app_done = time.perf_counter()
+response = app.test_client().get('/api/v1/status')
+request_done = time.perf_counter()
+try:
+    storage.count('User')
+except Exception:
+    pass  # no schema yet on the cold run
+query_done = time.perf_counter()
+print(json.dumps({
+    'import_models_ms': (models_done - started) * 1000,
+    'import_app_ms': (app_done - models_done) * 1000,
+    'first_request_ms': (request_done - app_done) * 1000,
+    'first_query_ms': (query_done - request_done) * 1000,
+    'status': response.status_code,
+    'db_touched_at_import': touched,
+}))
+'''
+
+
+def run(env):
+    """Starts one interpreter on the probe and returns its timings"""
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE], env=env,
+                            cwd=ROOT, check=True, capture_output=True,
+                            text=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    result['total_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def summary(values):
+    """Returns the median, min and max of the timings"""
+    return {'median': round(statistics.median(values), 2),
+            'min': round(min(values), 2),
+            'max': round(max(values), 2)}
+
+
+def benchmark(args, workdir):
+    """Creates the schema in workdir and measures the runs"""
+    env = dict(os.environ,
+               DB_ENGINE='sqlite',
+               DB_PATH=os.path.join(workdir, 'startup.db'),
+               MAIL_TRANSPORT='stub',
+               MAIL_QUEUE_PATH=os.path.join(workdir, 'mail.db'),
+               PYTHONPATH=ROOT)
+    env.pop('DB_URL', None)
+    env.setdefault('MAIN_APP_KEY', 'benchmark')
+    interpreter = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        interpreter.append((time.perf_counter() - started) * 1000)
+    # The import of a worker must not need the db, measure it before
+    # the schema exists and time the first query with it in place
+    cold = run(env)
+    subprocess.run([sys.executable, '-m', 'models.engine.migrations'],
+                   env=env, cwd=ROOT, check=True, capture_output=True)
+    runs = [run(env) for _ in range(args.runs)]
+    phases = ['import_models_ms', 'import_app_ms', 'first_request_ms',
+              'first_query_ms', 'total_ms']
+    return {
+        'runs': args.runs,
+        'python': sys.version.split()[0],
+        'interpreter_ms': summary(interpreter),
+        'db_touched_at_import': cold['db_touched_at_import'],
+        'phases': {phase: summary([r[phase] for r in runs])
+                   for phase in phases}
+    }
+
+
+def main():
+    """Runs the benchmark and writes the results as JSON"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='Write the JSON there too')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='hpfm-startup-') as workdir:
+        report = json.dumps(benchmark(args, workdir), indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
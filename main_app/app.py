@@ -12,6 +12,10 @@ from flask_login import LoginManager
 from flask.wrappers import Response
 import os
 from api.v1.api import api
+from utilities.hashing import HashingBusy
+from utilities.mail_queue import init_mail
+from utilities.query_metrics import init_query_metrics
+from utilities.user_cache import user_cache
 from dotenv import load_dotenv
 
 
@@ -21,6 +25,8 @@ MAILGUN_DOMAIN = os.getenv('MAILGUN_DOMAIN')
 APP_KEY = os.getenv('MAIN_APP_KEY')
 RECAPTCHA_PUBLIC_KEY = os.getenv('RECAPTCHA_PUBLIC_KEY')
 RECAPTCHA_PRIVATE_KEY = os.getenv('RECAPTCHA_PRIVATE_KEY')
+MAIL_TRANSPORT = os.getenv('MAIL_TRANSPORT', 'mailgun')
+MAIL_QUEUE_PATH = os.getenv('MAIL_QUEUE_PATH')
 
 
 app = Flask(__name__)
@@ -30,8 +36,12 @@ app.config['MAILGUN_DOMAIN'] = MAILGUN_DOMAIN
 app.config['SESSION_TYPE'] = 'filesystem'
 app.config['RECAPTCHA_PUBLIC_KEY'] = RECAPTCHA_PUBLIC_KEY
 app.config['RECAPTCHA_PRIVATE_KEY'] = RECAPTCHA_PRIVATE_KEY
+app.config['MAIL_TRANSPORT'] = MAIL_TRANSPORT
+app.config['MAIL_QUEUE_PATH'] = MAIL_QUEUE_PATH
 CORS(app) # allow cross-origin requests from any origin
 CSRFProtect(app) # csrf protection for all routes
+init_mail(app) # background mail dispatcher
+init_query_metrics(app) # per request sql stats
 app.register_blueprint(auth)
 app.register_blueprint(user_profile)
 app.register_blueprint(admin)
@@ -43,8 +53,20 @@ login_manager.login_view = 'auth.login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Loads a user"""
-    return storage.get('User', user_id)
+    """Loads a user principal, from the cache when possible"""
+    principal = user_cache.get(user_id)
+    if principal is None:
+        user = storage.get('User', user_id)
+        if user is None:
+            return None
+        principal = user_cache.put(user)
+    return principal
+
+
+@app.teardown_appcontext
+def close_storage(e):
+    """Releases the db session of the app context"""
+    storage.close()
 
 
 @app.errorhandler(403)
@@ -61,6 +83,12 @@ def add_csrf_cookie(response: Response):
     return response
 
 
+@app.errorhandler(HashingBusy)
+def handle_hashing_busy(err):
+    """Sheds load when the password hashing pool is full or slow"""
+    return 'Server busy, please try again shortly', 503, {'Retry-After': '1'}
+
+
 @app.errorhandler(404)
 def handle_not_found(err):
     """Handles 404 Error"""
@@ -4,9 +4,9 @@ from flask_wtf import FlaskForm
 from flask_wtf.recaptcha import RecaptchaField
 from wtforms import (TextAreaField, StringField,
                      PasswordField, IntegerField, RadioField,
-                     SubmitField, DateField, TextAreaField)
+                     SelectField, SubmitField, DateField, TextAreaField)
 from wtforms.validators import (DataRequired, Email, EqualTo,
-                                ValidationError, Length)
+                                ValidationError, Length, Optional)
 from models import storage
 import re
 from flask import current_app as app
@@ -129,10 +129,26 @@ class EditPatientForm(FlaskForm):
     submit = SubmitField('Edit Patient')
 
 class SearchPatientForm(FlaskForm):
-    """Creates a form to search patient"""
-    id_number = StringField('Identity Number', validators=[DataRequired()])
+    """Creates a form to search patient by id number, or by
+    approximate name when the id number is unknown"""
+    id_number = StringField('Identity Number', validators=[Optional()])
+    fullname = StringField('Name', validators=[Optional(),
+                                               Length(min=3, max=100)])
+    dob = DateField('DOB', validators=[Optional()], format='%Y-%m-%d')
+    sex = SelectField('Sex', default='',
+                      choices=[('', 'Any'), ('Male', 'Male'),
+                               ('Female', 'Female')])
     submit = SubmitField('Search')
 
+    def validate(self, extra_validators=None):
+        """Checks that an id number or a name is given"""
+        if not super().validate(extra_validators):
+            return False
+        if not self.id_number.data and not self.fullname.data:
+            self.id_number.errors.append('Enter an id number or a name')
+            return False
+        return True
+
 
 class AddMedicalrecordForm(FlaskForm):
     """Create a form to add medical record"""
@@ -1,6 +1,19 @@
 #!/usr/bin/python3
-"""Models init"""
-from models.engine.db_storage import DBStorage
+"""
+    Models init
+
+    The storage connects on first use, importing models never
+    touches the db. Tables are created and upgraded by
+    python -m models.engine.migrations.
+
+    .env is loaded before anything else is imported, the engine,
+    pool, replica and password hashing modules read their settings
+    at import time.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from models.engine.db_storage import DBStorage  # noqa: E402
 
 storage = DBStorage()
-storage.reload()
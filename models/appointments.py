@@ -1,12 +1,20 @@
 #!/usr/bin/python3
 """Appointments representation"""
-from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from models.base_model import BaseModel, Base, DateTime
+from sqlalchemy import Column, String, ForeignKey, Index, Integer
 
 
 class Appointment(BaseModel, Base):
     """Defines the appointments of a patient"""
     __tablename__ = 'appointments'
+    __table_args__ = (
+        Index('ix_appointments_patient_id_date', 'patient_id', 'date'),
+        Index('ix_appointments_staff_id_date', 'staff_id', 'date'),
+        Index('ix_appointments_created_at_id', 'created_at', 'id'),
+        Index('ix_appointments_updated_at', 'updated_at'),
+    )
     patient_id = Column(String(60), ForeignKey('patients.id'), nullable=False)
     staff_id = Column(String(60), ForeignKey('staff.id'), nullable=True)
     date = Column(DateTime, nullable=True)
+    duration = Column(Integer, nullable=False, default=30,
+                      server_default='30')
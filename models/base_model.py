@@ -6,15 +6,50 @@
     Defines the common 3 attributes that all objects will
     have and common methods.
 """
-from sqlalchemy import Column, DateTime, String
+from sqlalchemy import Column, Index, String
+from sqlalchemy import DateTime as _DateTime
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
 import uuid
 import models
+from models.serializer import serializer_for
 
 Base = declarative_base()
 
 
+def _not_mysql(ddl, target, bind, **kw):
+    """Checks if DDL is emitted for another db than MySQL"""
+    return kw['dialect'].name != 'mysql'
+
+
+def foreign_key_index(name, *columns):
+    """Returns an index on foreign key columns, left out on MySQL
+    where InnoDB already indexes foreign keys"""
+    return Index(name, *columns).ddl_if(callable_=_not_mysql)
+
+
+class DateTime(TypeDecorator):
+    """DateTime column also accepting ISO formatted strings, which
+    MySQL parses itself but the SQLite driver rejects. Microseconds
+    are kept on MySQL too, so an updated_at tells every write apart"""
+    impl = _DateTime
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        """Uses DATETIME(6) on MySQL"""
+        if dialect.name == 'mysql':
+            return dialect.type_descriptor(mysql.DATETIME(fsp=6))
+        return dialect.type_descriptor(_DateTime())
+
+    def process_bind_param(self, value, dialect):
+        """Parses string values into datetimes"""
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
+
+
 class BaseModel:
     """The Base Model class which contains common
     attributes and methods for the other models in
@@ -23,7 +58,7 @@ class BaseModel:
     id = Column(String(60), nullable=False, primary_key=True,
                 default=lambda: str(uuid.uuid4()))
     created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     def __init__(self, *args, **kwargs):
         """Object instantiation either from dictionary
@@ -63,16 +98,8 @@ class BaseModel:
         models.storage.save()
 
     def to_dict(self):
-        """Serilizes object for storage"""
-        obj_dict = self.__dict__.copy()
-        if 'created_at' in obj_dict:
-            obj_dict['created_at'] = obj_dict['created_at'].strftime("%Y-%m-%d %H:%M:%S")
-        if 'updated_at' in obj_dict:
-            obj_dict['updated_at'] = obj_dict['updated_at'].strftime("%Y-%m-%d %H:%M:%S")
-        obj_dict['__class__'] = self.__class__.__name__
-        if '_sa_instance_state' in obj_dict:
-            del obj_dict['_sa_instance_state']
-        return obj_dict
+        """Serilizes object columns for storage"""
+        return serializer_for(self.__class__).dump(self)
 
     def delete(self):
         """Deletes current object instance from db"""
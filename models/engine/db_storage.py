@@ -6,17 +6,18 @@ from models.appointments import Appointment
 from models.medical_record import MedicalRecord
 from models.user import User
 from models.staff import Staff
-import os
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
-
-load_dotenv()
-DB_U = os.getenv('DB_USERNAME')
-DB_P = os.getenv('DB_PASSWORD')
-DB_H = os.getenv('DB_HOST')
-DB_N = os.getenv('DB_NAME')
-
+from models.search_index import MedicalRecordTerm, PatientNameTrigram
+from models.engine.engines import engine_kind, replica_engines, storage_engine
+from models.engine.replicas import ReplicaSet, RoutingSession
+import threading
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from functools import wraps
+from flask import has_app_context
+from flask.globals import app_ctx
+from sqlalchemy import (and_, func, insert, literal, null, or_, select,
+                        union_all)
+from sqlalchemy.orm import scoped_session, selectinload, sessionmaker
 
 
 classes = {
@@ -25,26 +26,111 @@ classes = {
 }
 
 
+def encode_cursor(obj, column='created_at'):
+    """Encodes the (created_at, id) position of an object, or
+    the position on another datetime column, into an opaque
+    pagination cursor"""
+    raw = '{}|{}'.format(getattr(obj, column).isoformat(), obj.id)
+    return urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decodes a pagination cursor into its (created_at, id)
+    position, raises ValueError on a malformed cursor"""
+    try:
+        raw = urlsafe_b64decode(cursor.encode()).decode()
+        created_at, obj_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), obj_id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def session_scope():
+    """Scopes db sessions to the active Flask app context,
+    falling back to the current thread outside of one"""
+    if has_app_context():
+        return id(app_ctx._get_current_object())
+    return threading.get_ident()
+
+
+def replica_read(method):
+    """Runs the queries of a read only storage method on a
+    replica when replicas are configured"""
+    @wraps(method)
+    def read(self, *args, **kwargs):
+        with self.reading():
+            return method(self, *args, **kwargs)
+    return read
+
+
 class DBStorage():
     """Storange handling class"""
-    __engine = None
-    __session = None
 
-    def __init__(self):
-        """Instantiate storage object and creates engine and
-        session"""
-        self.__engine = create_engine(
-            'mysql+mysqldb://{}:{}@{}/{}'.format(DB_U,
-                                                        DB_P, DB_H, DB_N),
-                                      pool_pre_ping=True)
+    def __init__(self, engine=None, replicas=None):
+        """Instantiate storage object, the engine DB_ENGINE selects
+        and the DB_REPLICA_URLS replicas are created on first use
+        unless they are passed"""
+        self.__engine = engine
+        self.__replica_engines = replicas
+        self.__replicas = None
+        self.__registry = None
+        self.__lock = threading.Lock()
+
+    def __setup(self):
+        """Creates the engines and the session registry, an in-memory
+        db also gets its tables since no other process can reach it"""
+        with self.__lock:
+            if self.__registry is not None:
+                return
+            if self.__engine is None:
+                self.__engine = storage_engine()
+                if self.__replica_engines is None:
+                    self.__replica_engines = replica_engines()
+            if self.__replica_engines:
+                self.__replicas = ReplicaSet(self.__replica_engines)
+            if engine_kind(self.__engine.url) == 'memory':
+                Base.metadata.create_all(self.__engine)
+            self.reload()
+
+    @property
+    def __session(self):
+        """The session registry, set up on first use"""
+        if self.__registry is None:
+            self.__setup()
+        return self.__registry
+
+    @property
+    def engine(self):
+        """The engine the storage is bound to"""
+        if self.__registry is None:
+            self.__setup()
+        return self.__engine
+
+    @property
+    def replicas(self):
+        """The ReplicaSet reads are routed to, None without replicas"""
+        if self.__registry is None:
+            self.__setup()
+        return self.__replicas
+
+    def create_all(self):
+        """Creates all missing tables in db"""
+        Base.metadata.create_all(self.engine)
 
     def reload(self):
-        """Creates all tables in db and a current db session"""
-        Base.metadata.create_all(self.__engine)
-        session = sessionmaker(bind=self.__engine, expire_on_commit=False)
-        Session = scoped_session(session)
-        self.__session = Session()
+        """Creates the session registry, every app context or
+        thread gets its own session from it"""
+        session = sessionmaker(bind=self.__engine, class_=RoutingSession,
+                               replicas=self.__replicas,
+                               expire_on_commit=False)
+        self.__registry = scoped_session(session, scopefunc=session_scope)
+
+    def reading(self):
+        """Context manager routing the queries run in it to a
+        replica, until the session of the scope writes"""
+        return self.__session().reading()
 
+    @replica_read
     def get(self, cls, id):
         """Fetches one object from the db"""
         if type(cls) is str and cls in classes:
@@ -55,6 +141,7 @@ class DBStorage():
         else:
             return None
         
+    @replica_read
     def get_by_user_id(self, cls, id):
         """Fetches one object from the db by user_id"""
         if type(cls) is str and cls in classes:
@@ -65,6 +152,7 @@ class DBStorage():
         else:
             return None
         
+    @replica_read
     def get_id_by_user_id(self, cls, id):
         """Fetches one object from the db by user_id"""
         if type(cls) is str and cls in classes:
@@ -75,6 +163,7 @@ class DBStorage():
         else:
             return None
         
+    @replica_read
     def get_by_id_number(self, cls, id):
         """Fetches one object from the db by id_number"""
         if type(cls) is str and cls in classes:
@@ -85,6 +174,25 @@ class DBStorage():
         else:
             return None
 
+    @replica_read
+    def get_appointments(self, staff, start=None, end=None):
+        """Fetches the appointments of a staff member in date order,
+        only the ones starting in [start, end) when given"""
+        query = self.__session.query(Appointment)\
+            .filter(Appointment.staff_id == staff.id)
+        if start is not None:
+            query = query.filter(Appointment.date >= start)
+        if end is not None:
+            query = query.filter(Appointment.date < end)
+        return query.order_by(Appointment.date).all()
+
+    def lock(self, obj):
+        """Locks the db row of an object until the session
+        commits or rolls back"""
+        cls = obj.__class__
+        self.__session.execute(select(cls.id).where(cls.id == obj.id)
+                               .with_for_update())
+
     def new(self, obj):
         """Adds object to the db"""
         self.__session.add(obj)
@@ -93,11 +201,30 @@ class DBStorage():
         """Commits changes to db"""
         self.__session.commit()
 
+    def bulk_insert(self, cls, rows, commit=True):
+        """Inserts a list of column dicts of the class with one
+        executemany and commits them together, or leaves the commit
+        to the caller"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        self.__session.execute(insert(cls), rows)
+        if commit:
+            self.__session.commit()
+
+    def execute(self, statement, params=None):
+        """Executes a core statement in the db session"""
+        return self.__session.execute(statement, params)
+
+    def rollback(self):
+        """Rolls back uncommitted changes of the db session"""
+        self.__session.rollback()
+
     def delete(self, obj=None):
         """Deletes an object from the db"""
         if obj is not None:
             self.__session.delete(obj)
 
+    @replica_read
     def all(self, cls=None):
         """Makes a db query for objects and returns
         a dictionary of the objects"""
@@ -118,21 +245,242 @@ class DBStorage():
                     objects_dict[key] = obj
         return objects_dict
 
+    @replica_read
+    def page(self, cls, limit=50, after=None):
+        """Fetches one page of objects in stable (created_at, id)
+        order using keyset pagination and returns the objects with
+        the cursor of the next page, None when there are no more"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        if cls is None:
+            return [], None
+        query = self.__keyset(self.__session.query(cls), cls, after)
+        return self.__cut(query.limit(limit + 1).all(), limit)
+
+    @replica_read
+    def page_rows(self, cls, limit=50, after=None, fields=None):
+        """Same as page but returns raw rows of the class table
+        from a core select, without creating ORM instances, only
+        selecting the named columns when given. They must include
+        created_at and id, the position of the cursor"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        if cls is None:
+            return [], None
+        query = self.__keyset(self.__select(cls, fields), cls, after)
+        return self.__cut(self.__session.execute(
+            query.limit(limit + 1)).all(), limit)
+
+    @replica_read
+    def get_row(self, cls, value, fields=None, column='id'):
+        """Fetches the raw row of the class table whose column, id by
+        default, holds value, only selecting the named columns when
+        given, None when there is no such row"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        if cls is None:
+            return None
+        query = self.__select(cls, fields)\
+            .where(getattr(cls, column) == value).limit(1)
+        return self.__session.execute(query).first()
+
+    @staticmethod
+    def __select(cls, fields=None):
+        """Selects the named columns of the class table in the
+        passed order, every column when no names are given"""
+        if fields is None:
+            return select(cls.__table__)
+        return select(*[cls.__table__.c[field] for field in fields])
+
+    @staticmethod
+    def __keyset(query, cls, after):
+        """Orders a query by (created_at, id) and starts it
+        after the position of the passed cursor"""
+        if after:
+            created_at, obj_id = decode_cursor(after)
+            query = query.filter(or_(
+                cls.created_at > created_at,
+                and_(cls.created_at == created_at, cls.id > obj_id)))
+        return query.order_by(cls.created_at, cls.id)
+
+    @staticmethod
+    def __cut(results, limit, column='created_at'):
+        """Trims the extra lookahead result of a page and
+        returns the page with the next page cursor"""
+        if len(results) > limit:
+            results = results[:limit]
+            return results, encode_cursor(results[-1], column)
+        return results, None
+
+    @replica_read
+    def timeline(self, patient_id, limit=50, after=None, descending=False):
+        """Fetches one page of the medical records and appointments of
+        a patient merged in time order, records at their creation and
+        appointments at their date, with the name of the staff member
+        of every entry. One UNION ALL query whose branches each read at
+        most a page from their (patient_id, time) index, returns the
+        rows with the cursor of the next page, None at the end"""
+        position = decode_cursor(after) if after else None
+
+        def branch(kind, cls, at, *columns):
+            """Selects the next page of one table from the cursor"""
+            query = select(literal(kind).label('kind'), cls.id,
+                           at.label('at'), cls.staff_id, *columns,
+                           cls.created_at, cls.updated_at)\
+                .where(cls.patient_id == patient_id)
+            if position:
+                later = (at < position[0]) if descending \
+                    else (at > position[0])
+                tie = (cls.id < position[1]) if descending \
+                    else (cls.id > position[1])
+                query = query.where(or_(later, and_(at == position[0], tie)))
+            order = (at.desc(), cls.id.desc()) if descending \
+                else (at, cls.id)
+            return select(query.order_by(*order).limit(limit + 1)
+                          .subquery())
+
+        entries = union_all(
+            branch('medical_record', MedicalRecord, MedicalRecord.created_at,
+                   MedicalRecord.diagnosis, MedicalRecord.prescription,
+                   null().label('duration')),
+            branch('appointment', Appointment,
+                   func.coalesce(Appointment.date, Appointment.created_at),
+                   null().label('diagnosis'), null().label('prescription'),
+                   Appointment.duration)).subquery()
+        order = (entries.c.at.desc(), entries.c.id.desc()) if descending \
+            else (entries.c.at, entries.c.id)
+        query = select(entries, Staff.fullname.label('staff_name'))\
+            .outerjoin(Staff, Staff.id == entries.c.staff_id)\
+            .order_by(*order).limit(limit + 1)
+        return self.__cut(self.__session.execute(query).all(), limit, 'at')
+
+    @replica_read
+    def get_loaded(self, cls, id, *relationships):
+        """Fetches one object with the named relationships loaded
+        up front, one extra SELECT ... IN query per relationship
+        instead of a lazy load whenever one is touched"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        if cls is None:
+            return None
+        options = [selectinload(getattr(cls, name))
+                   for name in relationships]
+        return self.__session.query(cls).options(*options)\
+            .filter(cls.id == id).first()
+
+    @replica_read
+    def latest_rows(self, cls, column, values, n=5):
+        """Returns the n latest rows of the class table for each of
+        the values of a column, e.g. the latest records of a page of
+        patients, in one query ranking rows with a window function.
+        Rows come back in a dict of lists keyed by value"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        column = getattr(cls, column)
+        rank = func.row_number().over(
+            partition_by=column,
+            order_by=(cls.created_at.desc(), cls.id.desc())).label('rank')
+        ranked = select(cls.__table__, rank)\
+            .where(column.in_(values)).subquery()
+        query = select(*[ranked.c[col.key] for col in cls.__table__.c])\
+            .where(ranked.c.rank <= n)\
+            .order_by(ranked.c[column.key], ranked.c.rank)
+        latest = {value: [] for value in values}
+        for row in self.__session.execute(query):
+            latest[row._mapping[column.key]].append(row)
+        return latest
+
+    @replica_read
+    def count_by(self, cls, column, values):
+        """Counts the rows of the class for each of the values of a
+        column with one GROUP BY, e.g. the records of many patients"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        column = getattr(cls, column)
+        counts = dict.fromkeys(values, 0)
+        counts.update(self.__session.execute(
+            select(column, func.count()).where(column.in_(values))
+            .group_by(column)).all())
+        return counts
+
+    @replica_read
+    def fingerprint(self, cls, **filters):
+        """Returns the count and latest updated_at of the class
+        rows matching the equality filters, one of the two changes
+        whenever a matching row is added, updated or removed"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        query = select(func.count(), func.max(cls.updated_at))\
+            .select_from(cls).filter_by(**filters)
+        return tuple(self.__session.execute(query).one())
+
+    @replica_read
+    def iterate(self, cls, chunk_size=1000):
+        """Yields every object of the class in (created_at, id)
+        order, fetching rows from the db chunk_size at a time"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        if cls is None:
+            return iter(())
+        query = select(cls).order_by(cls.created_at, cls.id)
+        return self.__session.execute(
+            query.execution_options(yield_per=chunk_size)).scalars()
+
+    @replica_read
+    def iterate_rows(self, cls, chunk_size=1000, fields=None):
+        """Same as iterate but yields raw rows of the class table
+        from a core select, without creating ORM instances, only
+        selecting the named columns when given"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+        if cls is None:
+            return iter(())
+        query = self.__select(cls, fields)\
+            .order_by(cls.created_at, cls.id)
+        return self.__session.execute(
+            query.execution_options(yield_per=chunk_size))
+
     def close(self):
-        """Closes db session"""
-        self.__session.close()
+        """Closes and discards the db session of the current scope"""
+        if self.__registry is not None:
+            self.__registry.remove()
 
-    def count(self, cls=None):
+    @replica_read
+    def count(self, cls=None, since=None):
         """Counts objects belonging to the passed
-        class or all objects in db if no class is passed"""
+        class or all objects in db if no class is passed,
+        only counting objects created from since when given"""
         if cls is None:
-            return len(self.all())
+            return sum(self.counts(*classes.values(), since=since).values())
         if isinstance(cls, str):
             cls = classes.get(cls)
-            return len(self.all(cls))
-        else:
-            return len(self.all(cls))
-        
+        if cls is None:
+            return 0
+        return self.__session.execute(self.__count_query(cls, since)).scalar()
+
+    @replica_read
+    def counts(self, *cls, since=None):
+        """Counts objects of every passed class in a single
+        round trip and returns the counts keyed by class name"""
+        columns = []
+        for klas in cls:
+            if isinstance(klas, str):
+                klas = classes.get(klas)
+            if klas is not None:
+                query = self.__count_query(klas, since)
+                columns.append(query.scalar_subquery().label(klas.__name__))
+        if not columns:
+            return {}
+        return dict(self.__session.execute(select(*columns)).one()._mapping)
+
+    @staticmethod
+    def __count_query(cls, since=None):
+        """Builds a SELECT COUNT(*) for the class table"""
+        query = select(func.count()).select_from(cls)
+        if since is not None:
+            query = query.where(cls.created_at >= since)
+        return query
+
     
     def check_email(self, email):
         """Checks if an email is in the db"""
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""
+    Storage engine selection
+
+    DB_ENGINE picks the database DBStorage runs on:
+        mysql   the MySQL server of the DB_* settings (default)
+        sqlite  a SQLite file at DB_PATH in WAL mode, for small
+                single box installs
+        memory  a private in-memory SQLite db, for tests and demos
+    DB_URL overrides the settings with any SQLAlchemy URL, the engine
+    kind being taken from its scheme, and DB_REPLICA_URLS lists read
+    replicas the same way. Every kind gets pooling and connection
+    settings suited to it, the DBStorage interface is the same on
+    all of them. The pool of the mysql and sqlite kinds is sized by
+    the DB_POOL_* settings and reports its metrics, see pool_metrics.
+"""
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
+from models.engine.pool_metrics import MeteredQueuePool, instrument
+
+ENGINES = ('mysql', 'sqlite', 'memory')
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # readers don't block the writer
+    'synchronous': 'NORMAL',    # durable at checkpoints, safe with WAL
+    'foreign_keys': 'ON',
+    'busy_timeout': '5000',     # ms to wait on a locked db
+    'cache_size': '-20000',     # 20 MB page cache per connection
+    'temp_store': 'MEMORY',
+    'mmap_size': '134217728',
+}
+MEMORY_PRAGMAS = {'foreign_keys': 'ON'}
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+
+
+def mysql_url():
+    """Builds the MySQL URL from the DB_* settings"""
+    return 'mysql+mysqldb://{}:{}@{}/{}'.format(
+        os.getenv('DB_USERNAME'), os.getenv('DB_PASSWORD'),
+        os.getenv('DB_HOST'), os.getenv('DB_NAME'))
+
+
+def _set_pragmas(engine, pragmas):
+    """Applies the pragmas to every new connection of the engine"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        """Runs the pragmas on a new DBAPI connection"""
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {}={}'.format(name, value))
+        cursor.close()
+
+
+def engine_kind(url):
+    """Returns the engine kind of a SQLAlchemy URL"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return 'memory' if url.database in (None, '', ':memory:') \
+            else 'sqlite'
+    return url.get_backend_name()
+
+
+def pool_options():
+    """Returns the create_engine pool arguments of the
+    DB_POOL_* settings"""
+    return {'poolclass': MeteredQueuePool,
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_timeout': DB_POOL_TIMEOUT,
+            'pool_recycle': DB_POOL_RECYCLE}
+
+
+def mysql_engine(url):
+    """MySQL engine with a metered pool of recycled connections,
+    checked with a ping on checkout"""
+    engine = create_engine(url, pool_pre_ping=DB_POOL_PRE_PING,
+                           **pool_options())
+    instrument(engine)
+    return engine
+
+
+def sqlite_engine(url):
+    """SQLite file engine in WAL mode, connections are pooled and
+    shared between threads"""
+    path = make_url(url).database
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    engine = create_engine(url, connect_args={'check_same_thread': False,
+                                              'timeout': 30},
+                           **pool_options())
+    _set_pragmas(engine, SQLITE_PRAGMAS)
+    instrument(engine)
+    return engine
+
+
+def memory_engine(url='sqlite://'):
+    """In-memory SQLite engine, a single connection is kept for the
+    life of the engine since each connection has its own db"""
+    engine = create_engine(url, poolclass=StaticPool,
+                           connect_args={'check_same_thread': False})
+    _set_pragmas(engine, MEMORY_PRAGMAS)
+    return engine
+
+
+def engine_for_url(url):
+    """Creates the engine of a SQLAlchemy URL"""
+    kind = engine_kind(url)
+    if kind == 'memory':
+        return memory_engine(url)
+    if kind == 'sqlite':
+        return sqlite_engine(url)
+    return mysql_engine(url)
+
+
+def replica_engines():
+    """Creates the engines of the DB_REPLICA_URLS replicas"""
+    urls = os.getenv('DB_REPLICA_URLS', '')
+    return [engine_for_url(url.strip())
+            for url in urls.split(',') if url.strip()]
+
+
+def storage_engine():
+    """Creates the engine the settings select"""
+    url = os.getenv('DB_URL')
+    if not url:
+        kind = os.getenv('DB_ENGINE', 'mysql')
+        if kind not in ENGINES:
+            raise ValueError('DB_ENGINE must be one of {}'
+                             .format(', '.join(ENGINES)))
+        url = {'mysql': mysql_url,
+               'sqlite': lambda: 'sqlite:///{}'.format(
+                   os.getenv('DB_PATH', 'instance/hpfm.db')),
+               'memory': lambda: 'sqlite://'}[kind]()
+    return engine_for_url(url)
@@ -0,0 +1,218 @@
+#!/usr/bin/python3
+"""
+    Versioned schema migrations
+
+    Base.metadata.create_all only creates missing tables, so changes
+    to existing tables are applied here. Every migration has a version
+    number and the versions already applied to a database are kept
+    in the schema_version table. Upgrades are idempotent so running
+    them against a freshly created schema is a no-op.
+
+    Usage: python -m models.engine.migrations [--status]
+"""
+from datetime import datetime
+from sqlalchemy import (Column, DateTime, Index, Integer, MetaData,
+                        String, Table, inspect, select)
+from sqlalchemy.schema import CreateColumn
+from models.base_model import Base
+from models.base_model import DateTime as DateTimeType
+
+# The foreign_key_index indexes of the models, InnoDB already
+# indexes foreign key columns so MySQL doesn't get them
+FOREIGN_KEY_INDEXES = {'ix_staff_user_id', 'ix_medical_records_staff_id'}
+
+version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(128), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+
+def _create_indexes(connection, indexes):
+    """Creates the (name, table, columns) indexes missing
+    from the database, but not the foreign key ones on MySQL"""
+    inspector = inspect(connection)
+    for name, table, columns in indexes:
+        if (connection.dialect.name == 'mysql' and
+                name in FOREIGN_KEY_INDEXES):
+            continue
+        existing = [ix['name'] for ix in inspector.get_indexes(table)]
+        if name in existing:
+            continue
+        table = Base.metadata.tables[table]
+        Index(name, *[table.c[col] for col in columns]).create(connection)
+
+
+def _add_columns(connection, table, columns):
+    """Adds the named columns of a model table missing
+    from the database"""
+    existing = [col['name'] for col in inspect(connection).get_columns(table)]
+    for name in columns:
+        if name in existing:
+            continue
+        column = Base.metadata.tables[table].c[name]
+        ddl = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(
+            'ALTER TABLE {} ADD COLUMN {}'.format(table, ddl))
+
+
+def _drop_duplicate_indexes(connection, names):
+    """Drops the named indexes where another index of their table
+    starts with the same columns, like the one InnoDB creates for
+    a foreign key"""
+    inspector = inspect(connection)
+    for table in Base.metadata.tables:
+        indexes = inspector.get_indexes(table)
+        for index in indexes:
+            if index['name'] not in names:
+                continue
+            columns = index['column_names']
+            if any(other['name'] != index['name'] and
+                   other['column_names'][:len(columns)] == columns
+                   for other in indexes):
+                connection.exec_driver_sql('DROP INDEX {} ON {}'.format(
+                    index['name'], table))
+
+
+def _modify_columns(connection, table, columns):
+    """Redefines the named columns of a model table as the
+    model declares them now"""
+    for name in columns:
+        column = Base.metadata.tables[table].c[name]
+        ddl = CreateColumn(column).compile(dialect=connection.dialect)
+        connection.exec_driver_sql(
+            'ALTER TABLE {} MODIFY {}'.format(table, ddl))
+
+
+def add_lookup_indexes(connection):
+    """Adds secondary indexes on the hot lookup columns"""
+    _create_indexes(connection, [
+        ('ix_patients_id_number', 'patients', ['id_number']),
+        ('ix_patients_created_at_id', 'patients', ['created_at', 'id']),
+        ('ix_patients_updated_at', 'patients', ['updated_at']),
+        ('ix_staff_user_id', 'staff', ['user_id']),
+        ('ix_staff_created_at_id', 'staff', ['created_at', 'id']),
+        ('ix_medical_records_patient_id_created_at', 'medical_records',
+         ['patient_id', 'created_at']),
+        ('ix_medical_records_staff_id', 'medical_records', ['staff_id']),
+        ('ix_medical_records_created_at_id', 'medical_records',
+         ['created_at', 'id']),
+        ('ix_medical_records_updated_at', 'medical_records',
+         ['updated_at']),
+        ('ix_appointments_patient_id_date', 'appointments',
+         ['patient_id', 'date']),
+        ('ix_appointments_staff_id_date', 'appointments',
+         ['staff_id', 'date']),
+        ('ix_appointments_created_at_id', 'appointments',
+         ['created_at', 'id']),
+        ('ix_users_verification_token', 'users', ['verification_token']),
+        ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+    ])
+
+
+def add_search_tables(connection):
+    """Adds the tables of the search indexes, fill them with
+    python -m services.search rebuild"""
+    for name in ['medical_record_terms']:
+        Base.metadata.tables[name].create(connection, checkfirst=True)
+
+
+def add_name_search_tables(connection):
+    """Adds the patient name trigram table, fill it with
+    python -m services.search rebuild"""
+    for name in ['patient_name_trigrams']:
+        Base.metadata.tables[name].create(connection, checkfirst=True)
+
+
+def add_appointment_duration(connection):
+    """Adds the duration in minutes of appointments"""
+    _add_columns(connection, 'appointments', ['duration'])
+
+
+def microsecond_timestamps(connection):
+    """Keeps the microseconds of created_at and updated_at on
+    MySQL, SQLite already stores them"""
+    if connection.dialect.name != 'mysql':
+        return
+    for name, table in Base.metadata.tables.items():
+        if 'updated_at' in table.c:
+            _modify_columns(connection, name, ['created_at', 'updated_at'])
+
+
+def add_updated_at_indexes(connection):
+    """Indexes updated_at of the remaining tables and drops the
+    foreign key indexes MySQL kept twice"""
+    _create_indexes(connection, [
+        ('ix_appointments_updated_at', 'appointments', ['updated_at']),
+        ('ix_staff_updated_at', 'staff', ['updated_at']),
+        ('ix_users_updated_at', 'users', ['updated_at']),
+    ])
+    if connection.dialect.name == 'mysql':
+        _drop_duplicate_indexes(connection, FOREIGN_KEY_INDEXES)
+
+
+def microsecond_dates(connection):
+    """Keeps the microseconds of the other DateTime columns on MySQL
+    too, like fresh tables do"""
+    if connection.dialect.name != 'mysql':
+        return
+    for name, table in Base.metadata.tables.items():
+        columns = [column.name for column in table.c
+                   if isinstance(column.type, DateTimeType) and
+                   column.name not in ('created_at', 'updated_at')]
+        if columns:
+            _modify_columns(connection, name, columns)
+
+
+MIGRATIONS = [
+    (1, 'Secondary indexes on hot lookup columns', add_lookup_indexes),
+    (2, 'Full text search index tables', add_search_tables),
+    (3, 'Patient name trigram index table', add_name_search_tables),
+    (4, 'Appointment durations', add_appointment_duration),
+    (5, 'Microsecond timestamps', microsecond_timestamps),
+    (6, 'updated_at indexes, no duplicate foreign key indexes',
+     add_updated_at_indexes),
+    (7, 'Microsecond dates', microsecond_dates),
+]
+
+
+def applied_versions(engine):
+    """Returns the set of migration versions applied to the db"""
+    version_metadata.create_all(engine)
+    with engine.connect() as connection:
+        rows = connection.execute(select(schema_version.c.version))
+        return {row.version for row in rows}
+
+
+def migrate(engine):
+    """Creates missing tables and applies pending migrations in
+    version order, returns the versions that were applied"""
+    Base.metadata.create_all(engine)
+    done = applied_versions(engine)
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version in done:
+            continue
+        with engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(schema_version.insert().values(
+                version=version, description=description,
+                applied_at=datetime.now()))
+        applied.append(version)
+    return applied
+
+
+if __name__ == '__main__':
+    import sys
+    from models import storage
+
+    done = applied_versions(storage.engine)
+    if '--status' in sys.argv:
+        for version, description, _ in MIGRATIONS:
+            state = 'applied' if version in done else 'pending'
+            print('{:>4}  {:<8} {}'.format(version, state, description))
+    else:
+        applied = migrate(storage.engine)
+        print('Applied migrations: {}'.format(applied or 'none'))
@@ -0,0 +1,144 @@
+#!/usr/bin/python3
+"""
+    Connection pool metrics
+
+    Pooled engines use MeteredQueuePool, a QueuePool timing how long
+    every checkout waits for a connection, and instrument() counts
+    the connects, invalidations and failed pre-pings of their pool.
+    snapshot() reports the live checked out, idle and overflow
+    connections with those counters and a histogram of the waits,
+    so the pool can be sized to the number of workers from data.
+    Metrics are kept per process.
+"""
+import bisect
+import threading
+from time import perf_counter
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolMetrics:
+    """Counters and checkout wait histogram of a pool"""
+
+    def __init__(self):
+        """Starts every counter at 0"""
+        self.__lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pre_ping_failures = 0
+        self.wait_count = 0
+        self.wait_sum_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def count(self, name):
+        """Adds one to a counter"""
+        with self.__lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe_wait(self, seconds):
+        """Records how long a checkout waited"""
+        ms = seconds * 1000
+        with self.__lock:
+            self.wait_count += 1
+            self.wait_sum_ms += ms
+            self.wait_max_ms = max(self.wait_max_ms, ms)
+            self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS_MS, ms)] += 1
+
+    def to_dict(self):
+        """Returns the counters and the cumulative wait histogram,
+        a list of the waits up to the bound of every bucket in ms"""
+        with self.__lock:
+            histogram, total = [], 0
+            for bound, count in zip(WAIT_BUCKETS_MS + ('+Inf',),
+                                    self.wait_buckets):
+                total += count
+                histogram.append({'le': bound, 'count': total})
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'pre_ping_failures': self.pre_ping_failures,
+                'wait_ms': {
+                    'count': self.wait_count,
+                    'sum': round(self.wait_sum_ms, 3),
+                    'max': round(self.wait_max_ms, 3),
+                    'buckets': histogram
+                }
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool recording how long checkouts wait for a
+    connection, including the time to open new ones"""
+
+    def __init__(self, *args, **kwargs):
+        """Creates the pool with fresh metrics"""
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        """Keeps the metrics when the pool is replaced, e.g. on
+        engine.dispose() or after a disconnect"""
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        """Checks out a connection, timing the wait"""
+        start = perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.count('timeouts')
+            raise
+        finally:
+            self.metrics.observe_wait(perf_counter() - start)
+        self.metrics.count('checkouts')
+        return record
+
+
+def instrument(engine):
+    """Counts the connects and invalidations of the engine pool,
+    pre-ping failures invalidate with InvalidatePoolError"""
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        """Counts a new DBAPI connection"""
+        metrics = getattr(engine.pool, 'metrics', None)
+        if metrics is not None:
+            metrics.count('connects')
+
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        """Counts an invalidated connection"""
+        metrics = getattr(engine.pool, 'metrics', None)
+        if metrics is None:
+            return
+        metrics.count('invalidations')
+        if isinstance(exception, exc.InvalidatePoolError):
+            metrics.count('pre_ping_failures')
+
+
+def snapshot(engine):
+    """Returns the live state and the metrics of the engine pool"""
+    pool = engine.pool
+    data = {'url': engine.url.render_as_string(),
+            'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        data.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+            'checked_out': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        data.update(metrics.to_dict())
+    return data
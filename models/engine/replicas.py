@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+"""
+    Read replica routing
+
+    DB_REPLICA_URLS lists replicas of the primary db. Storage calls
+    that only read run inside RoutingSession.reading() and go to a
+    healthy replica, every other statement goes to the primary. Once
+    a session wrote, its reads stay on the primary as well so a
+    request always reads its own writes. A background thread checks
+    the replicas every DB_REPLICA_CHECK_INTERVAL seconds, the ones
+    that fail or lag more than DB_REPLICA_MAX_LAG seconds behind are
+    skipped and reads fall back to the primary when none is left, or
+    before the first check is done.
+"""
+import itertools
+import os
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '5'))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL',
+                                            '5'))
+
+
+class ReplicaSet:
+    """Replica engines with their health, checked periodically
+    on a background thread"""
+
+    def __init__(self, engines, max_lag=DB_REPLICA_MAX_LAG,
+                 check_interval=DB_REPLICA_CHECK_INTERVAL):
+        """Stores the replica engines, all unchecked, the checks
+        start with the first pick"""
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.__lags = {engine: None for engine in self.engines}
+        self.__healthy = []
+        self.__turn = itertools.count()
+        self.__stopping = threading.Event()
+        self.__thread = None
+        self.__lock = threading.Lock()
+        for engine in self.engines:
+            event.listen(engine, 'handle_error', self.__on_error)
+
+    def __on_error(self, context):
+        """Takes a replica out until the next check when
+        its connection drops"""
+        if context.is_disconnect and context.engine is not None:
+            self.mark_down(context.engine)
+
+    @staticmethod
+    def lag(engine):
+        """Returns how many seconds a replica is behind, 0 when the
+        db can't tell, None when replication is broken"""
+        with engine.connect() as connection:
+            if engine.dialect.name != 'mysql':
+                connection.exec_driver_sql('SELECT 1')
+                return 0
+            for statement, column in [
+                    ('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+                    ('SHOW SLAVE STATUS', 'Seconds_Behind_Master')]:
+                try:
+                    row = connection.exec_driver_sql(statement)\
+                        .mappings().first()
+                except Exception:
+                    continue
+                return 0 if row is None else row.get(column)
+            return 0
+
+    def check(self):
+        """Measures the lag of every replica and keeps the ones
+        close enough to the primary"""
+        healthy = []
+        for engine in self.engines:
+            try:
+                lag = self.lag(engine)
+            except Exception:
+                lag = None
+            self.__lags[engine] = lag
+            if lag is not None and lag <= self.max_lag:
+                healthy.append(engine)
+        self.__healthy = healthy
+
+    def mark_down(self, engine):
+        """Skips a replica until the next check"""
+        self.__healthy = [healthy for healthy in self.__healthy
+                          if healthy is not engine]
+        self.__lags[engine] = None
+
+    def start(self):
+        """Starts the checking thread once per process"""
+        with self.__lock:
+            if self.__thread is not None and self.__thread.is_alive():
+                return
+            self.__thread = threading.Thread(target=self._watch,
+                                             daemon=True,
+                                             name='replica-check')
+            self.__thread.start()
+
+    def stop(self, timeout=None):
+        """Stops the checking thread"""
+        self.__stopping.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+    def _watch(self):
+        """Checks the replicas until stopped"""
+        while not self.__stopping.is_set():
+            self.check()
+            self.__stopping.wait(self.check_interval)
+
+    def pick(self):
+        """Returns the next healthy replica in turn from the last
+        check, None when reads must go to the primary"""
+        if not self.__stopping.is_set() and \
+                (self.__thread is None or not self.__thread.is_alive()):
+            # After a fork the thread of the parent is gone
+            self.start()
+        healthy = self.__healthy
+        if not healthy:
+            return None
+        return healthy[next(self.__turn) % len(healthy)]
+
+    def status(self):
+        """Returns the url, lag and health of every replica"""
+        healthy = self.__healthy
+        return [{'url': engine.url.render_as_string(),
+                 'lag': self.__lags[engine],
+                 'healthy': engine in healthy} for engine in self.engines]
+
+
+class RoutingSession(Session):
+    """Session sending the reads made in reading() blocks to a
+    replica until the session writes"""
+
+    def __init__(self, replicas=None, **kwargs):
+        """Creates a session that may read from the replicas"""
+        super().__init__(**kwargs)
+        self.replicas = replicas
+
+    @contextmanager
+    def reading(self):
+        """Routes the statements run in the block to a replica"""
+        self.info['reading'] = self.info.get('reading', 0) + 1
+        try:
+            yield self
+        finally:
+            self.info['reading'] -= 1
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        """Picks the engine a statement runs on"""
+        if self._flushing or getattr(clause, 'is_dml', False) or \
+                getattr(clause, '_for_update_arg', None) is not None:
+            self.info['wrote'] = True
+        elif self.replicas and self.info.get('reading') and \
+                not self.info.get('wrote'):
+            replica = self.replicas.pick()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause=clause, **kwargs)
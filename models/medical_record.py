@@ -2,13 +2,20 @@
 """This module represents the medical record
 object of a patient"""
 
-from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, ForeignKey
+from models.base_model import BaseModel, Base, foreign_key_index
+from sqlalchemy import Column, String, ForeignKey, Index
 
 
 class MedicalRecord(BaseModel, Base):
     """Definition of the medical records"""
     __tablename__ = 'medical_records'
+    __table_args__ = (
+        Index('ix_medical_records_patient_id_created_at',
+              'patient_id', 'created_at'),
+        foreign_key_index('ix_medical_records_staff_id', 'staff_id'),
+        Index('ix_medical_records_created_at_id', 'created_at', 'id'),
+        Index('ix_medical_records_updated_at', 'updated_at'),
+    )
     patient_id = Column(String(60), ForeignKey('patients.id'), nullable=False)
     staff_id = Column(String(60), ForeignKey('staff.id'), nullable=False)
     diagnosis = Column(String(1024), nullable=False)
@@ -1,16 +1,20 @@
 #!/usr/bin/python3
 """This module represents the patient object"""
 
-from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, DateTime
+from models.base_model import BaseModel, Base, DateTime
+from sqlalchemy import Column, String, Index
 from sqlalchemy.orm import relationship
 
 
 class Patient(BaseModel, Base):
     """Patient object definition"""
     __tablename__ = 'patients'
+    __table_args__ = (
+        Index('ix_patients_created_at_id', 'created_at', 'id'),
+        Index('ix_patients_updated_at', 'updated_at'),
+    )
     fullname = Column(String(100), nullable=False)
-    id_number = Column(String(13), nullable=False)
+    id_number = Column(String(13), nullable=False, index=True)
     dob = Column(DateTime, nullable=False)
     sex = Column(String(6), nullable=False)
     address = Column(String(256), nullable=False)
@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+"""This module represents the search index tables
+kept in sync with the searchable models"""
+
+from models.base_model import Base
+from sqlalchemy import Column, String, Integer, ForeignKey, Index
+
+
+class MedicalRecordTerm(Base):
+    """Posting of a term in a medical record, the primary key
+    keeps postings clustered by term for prefix range scans"""
+    __tablename__ = 'medical_record_terms'
+    __table_args__ = (
+        Index('ix_medical_record_terms_record_id', 'record_id'),
+    )
+    term = Column(String(64), primary_key=True)
+    record_id = Column(String(60),
+                       ForeignKey('medical_records.id', ondelete='CASCADE'),
+                       primary_key=True)
+    weight = Column(Integer, nullable=False)
+
+
+class PatientNameTrigram(Base):
+    """Trigram of a patient's name, the primary key keeps the
+    patients sharing a trigram together for the candidate lookups"""
+    __tablename__ = 'patient_name_trigrams'
+    __table_args__ = (
+        Index('ix_patient_name_trigrams_patient_id', 'patient_id'),
+    )
+    trigram = Column(String(3), primary_key=True)
+    patient_id = Column(String(60),
+                        ForeignKey('patients.id', ondelete='CASCADE'),
+                        primary_key=True)
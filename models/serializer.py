@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""
+    Column based serializers for the models
+
+    A serializer is built once per model from its table columns and
+    always outputs the same fields, whatever attributes happen to be
+    loaded on an instance. It can also serialize raw rows of a core
+    select() over the model table without creating ORM instances.
+    A serializer may be limited to some of the fields, selecting only
+    those columns keeps the rest out of the query and the payload.
+"""
+from operator import attrgetter, itemgetter
+
+DATETIME_FIELDS = ('created_at', 'updated_at')
+KEY_FIELDS = ('id', 'created_at', 'updated_at')
+
+
+class Serialized(dict):
+    """Serialized object, version keeps the full precision
+    updated_at the output rounds to the second"""
+    __slots__ = ('version',)
+
+
+class Serializer:
+    """Serializes the objects or table rows of one model"""
+
+    def __init__(self, cls, fields=None):
+        """Builds the field list and getters from the model table,
+        limited to the serialized_fields allowlist of models that
+        have one, only keeping the passed fields and the KEY_FIELDS
+        that identify, order and version an object when given.
+        Raises ValueError on fields that aren't serialized columns
+        of the model"""
+        self.class_name = cls.__name__
+        allowed = getattr(cls, 'serialized_fields', None)
+        self.fields = tuple(column.key for column in cls.__table__.columns
+                            if allowed is None or column.key in allowed)
+        if fields is not None:
+            unknown = sorted(set(fields) - set(self.fields))
+            if unknown:
+                raise ValueError('Unknown fields: ' + ', '.join(unknown))
+            wanted = set(fields).union(KEY_FIELDS)
+            self.fields = tuple(field for field in self.fields
+                                if field in wanted)
+        self.datetime_fields = tuple(field for field in self.fields
+                                     if field in DATETIME_FIELDS)
+        self.__item_getter = itemgetter(*self.fields)
+        self.__attr_getter = attrgetter(*self.fields)
+
+    def dump_row(self, row):
+        """Serializes a row holding the model columns in table order"""
+        data = Serialized(zip(self.fields, row))
+        data.version = data.get('updated_at')
+        for field in self.datetime_fields:
+            value = data[field]
+            if value is not None:
+                data[field] = value.isoformat(' ', 'seconds')
+        data['__class__'] = self.class_name
+        return data
+
+    def dump(self, obj):
+        """Serializes a model instance, reading loaded values
+        straight from the instance dict and only going through
+        the attributes when some column isn't loaded"""
+        try:
+            values = self.__item_getter(obj.__dict__)
+        except KeyError:
+            values = self.__attr_getter(obj)
+        return self.dump_row(values)
+
+
+_serializers = {}
+
+
+def serializer_for(cls, fields=None):
+    """Returns the cached serializer of a model class, or a
+    serializer of some of its fields"""
+    if fields is not None:
+        return Serializer(cls, fields)
+    serializer = _serializers.get(cls)
+    if serializer is None:
+        serializer = _serializers[cls] = Serializer(cls)
+    return serializer
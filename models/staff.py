@@ -1,14 +1,19 @@
 #!/usr/bin/python3
 """Staff represents the medical staff be
 it receptionist, nurse or doctor"""
-from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from models.base_model import BaseModel, Base, DateTime, foreign_key_index
+from sqlalchemy import Column, String, ForeignKey, Index, Integer
 from sqlalchemy.orm import relationship
 
 
 class Staff(BaseModel, Base):
     """Respresentation of the staff"""
     __tablename__ = 'staff'
+    __table_args__ = (
+        Index('ix_staff_created_at_id', 'created_at', 'id'),
+        Index('ix_staff_updated_at', 'updated_at'),
+        foreign_key_index('ix_staff_user_id', 'user_id'),
+    )
     fullname = Column(String(100), nullable=False)
     id_number = Column(String(13), nullable=False)
     dob = Column(DateTime, nullable=False)
@@ -5,20 +5,27 @@ import models
 from models.base_model import BaseModel, Base
 from flask_login import UserMixin
 from flask import current_app
-from sqlalchemy import Column, String, Boolean
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import Column, String, Boolean, Index
 from itsdangerous import URLSafeTimedSerializer as Serializer
+from utilities.hashing import hash_password, needs_rehash, verify_password
 
 
 class User(BaseModel, Base, UserMixin):
     """Class defining a user model"""
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_created_at_id', 'created_at', 'id'),
+        Index('ix_users_updated_at', 'updated_at'),
+    )
     username = Column(String(64), unique=True, nullable=False)
     email = Column(String(100), nullable=False, unique=True)
     password_hash = Column(String(255), nullable=False)
     verified = Column(Boolean, default=False)
-    verification_token = Column(String(128))
+    verification_token = Column(String(128), index=True)
     role = Column(String(10), default='user')
+    # The password hash and verification token never leave the server
+    serialized_fields = ('id', 'created_at', 'updated_at', 'username',
+                         'email', 'verified', 'role')
 
     def generate_verification_token(self, expires_sec='3600'):
         """Generates an email verification code"""
@@ -37,11 +44,15 @@ class User(BaseModel, Base, UserMixin):
 
     def set_password(self, password):
         """Creates a hashed password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """Checks password against hashed password"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Checks if the password hash uses outdated parameters"""
+        return needs_rehash(self.password_hash)
 
     @property
     def is_authenticated(self):
@@ -3,18 +3,22 @@
 from flask import (Blueprint, render_template, flash,
                    redirect, url_for, abort, request)
 from flask_login import current_user
-import requests
 from utilities.decorators import admin_required
+from utilities.query_metrics import query_budget
 from functools import wraps
 from main_app.forms import (AddPatientForm,
                             SearchPatientForm,
                             AddMedicalrecordForm,
                             EditPatientForm, EditMedicalrecordForm)
-import json
 from markupsafe import escape
 from models.patient import Patient
 from models.medical_record import MedicalRecord
 from models import storage
+from services import ServiceError
+from services import medical_records as medical_record_service
+from services import patients as patient_service
+from services import search as search_service
+from services import stats as stats_service
 
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
@@ -25,15 +29,10 @@ admin = Blueprint('admin', __name__, url_prefix='/admin')
 @admin_required
 def admin_dashboard():
     """Renders the admin dashboard"""
-    # Get cookies from session
-    session_cookies = request.cookies
-    url = 'http://0.0.0.0:5001/api/v1/stats'
-    # Pass cookies in the request to api
-    with requests.get(url, cookies=session_cookies) as response:
-        if response.status_code == 200:
-            stats = response.json()
-        else:
-            stats = {}
+    try:
+        stats = stats_service.get_stats()
+    except ServiceError:
+        stats = {}
     return render_template('admin/admin_dashboard.html',
                            current_user=current_user,
                            stats=stats)
@@ -48,15 +47,28 @@ def manage_patients():
     # Handle form after validation
     if form.validate_on_submit():
         id_num = form.id_number.data
-        patient = storage.get_by_id_number(Patient, id_num)
-        if patient:
-            return render_template('admin/manage_patients.html',
-                                   current_user=current_user, patient=patient,
-                                   form=form)
-        else:
+        if id_num:
+            patient = storage.get_by_id_number(Patient, id_num)
+            if patient:
+                return render_template('admin/manage_patients.html',
+                                       current_user=current_user,
+                                       patient=patient, form=form)
             flash("Patient not found, check id number and try again",
                   'danger')
             return redirect(url_for('admin.manage_patients'))
+        dob = str(form.dob.data) if form.dob.data else None
+        try:
+            results = search_service.search_patients(
+                form.fullname.data, dob, form.sex.data or None)
+        except ServiceError as e:
+            flash(e.message, 'danger')
+        else:
+            if results['patients']:
+                return render_template('admin/manage_patients.html',
+                                       current_user=current_user,
+                                       patients=results['patients'],
+                                       form=form)
+            flash("No patient with a similar name found", 'danger')
     if form.errors != {}:
         for cat, msg in form.errors.items():
             flash(msg[0], 'danger')
@@ -70,7 +82,6 @@ def manage_patients():
 def add_patient():
     """Add patient route"""
     form = AddPatientForm()
-    session_cookies = request.cookies
     if form.validate_on_submit():
         # Get data from form
         data = {
@@ -82,25 +93,13 @@ def add_patient():
         'email': form.email.data,
         'cell': form.cell.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/patients'
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.post(url,
-                                 cookies=session_cookies,
-                                 headers=headers,
-                                 data=json.dumps(data)
-                                 )
-        if response.status_code == 201:
-            # Reload storage to get new patient
-            storage.reload()
-            flash('Patient added successfully', 'success')
-            return redirect(url_for('admin.add_patient'))
-        else:
+        try:
+            patient_service.create_patient(data)
+        except ServiceError:
             flash('An error occurred. Please try again', 'danger')
-            return redirect(url_for('admin.add_patient'))
+        else:
+            flash('Patient added successfully', 'success')
+        return redirect(url_for('admin.add_patient'))
     if form.errors != {}:
         # Print error messages to frontend
         for category, error_msg in form.errors.items():
@@ -111,61 +110,37 @@ def add_patient():
 @admin.route('/view_patient/<string:id>', methods=['GET', 'POST'],
              strict_slashes=False)
 @admin_required
+@query_budget(8)
 def view_patient(id):
     """Patient view"""
     id = escape(id)
     form = AddMedicalrecordForm() 
-    session_cookies = request.cookies
-    url = 'http://0.0.0.0:5001/api/v1/patients/{}'.format(id)
-    with requests.get(url, cookies=session_cookies) as response:
-        # Get Patient 1st
-        if response.status_code == 200:
-            patient = response.json()
-            # Then handle medical record entry
-            if form.validate_on_submit():
-                # Get data from form
-                data = {
-                    'patient_id': id,
-                    'staff_id': storage.get_id_by_user_id('Staff', current_user.id),
-                    'diagnosis': form.diagnosis.data,
-                    'prescription': form.prescription.data
-                }
-                url = 'http://0.0.0.0:5001/api/v1/medical_records'
-                # Define headers for the request
-                headers = {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': request.cookies.get('csrftoken')
-                    }
-                response = requests.post(url, headers=headers,
-                                         cookies=session_cookies,
-                                         data=json.dumps(data))
-                if response.status_code == 201:
-                    # Reload storage to get the new medical record
-                    storage.reload()
-                    url_prefix = 'http://0.0.0.0:5001/api/v1/patients'
-                    url_postfix = '/{}/medical_records'.format(id)
-                    url = '{}{}'.format(url_prefix, url_postfix)
-                    with requests.get(url, cookies=session_cookies) as response:
-                        if response.status_code == 200:
-                            medical_records = response.json()
-                            return render_template('admin/view_patient.html',
-                                           medical_records=medical_records,
-                                           current_user=current_user,
-                                           form=form, patient=patient)
-            # Creating two parts of the URL due to length restrictions
-            url_prefix = 'http://0.0.0.0:5001/api/v1/patients'
-            url_postfix = '/{}/medical_records'.format(id)
-            url = '{}{}'.format(url_prefix, url_postfix)
-            with requests.get(url, cookies=session_cookies) as response:
-                if response.status_code == 200:
-                    medical_records = response.json()
-                    return render_template('admin/view_patient.html',
-                                   patient=patient,
-                                   medical_records=medical_records,
-                                   current_user=current_user,
-                                   form=form)
+    try:
+        # Get Patient 1st, with their records and appointments
+        patient = patient_service.get_patient_file(id)
+        # Then handle medical record entry
+        if form.validate_on_submit():
+            # Get data from form
+            data = {
+                'patient_id': id,
+                'staff_id': storage.get_id_by_user_id('Staff', current_user.id),
+                'diagnosis': form.diagnosis.data,
+                'prescription': form.prescription.data
+            }
+            try:
+                patient['medical_records'].append(
+                    medical_record_service.create_medical_record(data))
+            except ServiceError:
+                flash('An error occurred. Please try again', 'danger')
+        medical_records = {'medical_records': patient['medical_records']}
+    except ServiceError:
         flash('Patient not found', 'danger')
         return redirect(url_for('admin.admin_dashboard'))
+    return render_template('admin/view_patient.html',
+                           patient=patient,
+                           medical_records=medical_records,
+                           current_user=current_user,
+                           form=form)
     
 
 @admin.route('/edit_patient/<string:patient_id>', methods=['GET', 'POST'],
@@ -173,7 +148,6 @@ def view_patient(id):
 def edit_patient(patient_id):
     """Edits a patient"""
     form = EditPatientForm()
-    session_cookies = request.cookies
     p_id = escape(patient_id)
     patient = storage.get(Patient, p_id)
     if patient is None:
@@ -203,25 +177,13 @@ def edit_patient(patient_id):
         'email': form.email.data,
         'cell': form.cell.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/patients/{}'.format(p_id)
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.put(url,
-                                cookies=session_cookies,
-                                headers=headers,
-                                data=json.dumps(data)
-                                )
-        if response.status_code == 200:
-            # Reload storage to get the updated patient
-            storage.reload()
-            flash('Patient updated successfully', 'success')
-            return redirect(url_for('admin.view_patient', id=p_id))
-        else:
+        try:
+            patient_service.update_patient(p_id, data)
+        except ServiceError:
             flash('An error occurred. Please try again', 'danger')
             return redirect(url_for('user_profile.profile'))
+        flash('Patient updated successfully', 'success')
+        return redirect(url_for('admin.view_patient', id=p_id))
     if form.errors != {}:
         for category, error_msg in form.errors.items():
             flash(str(error_msg[0]), 'danger')
@@ -234,7 +196,6 @@ def edit_medical_record(rec_id):
     """Edits a medical record"""
     rec_id = escape(rec_id)
     form = EditMedicalrecordForm()
-    session_cookies = request.cookies
     # Could improve and use an api call instead
     rec = storage.get(MedicalRecord, rec_id)
     if rec is None:
@@ -254,24 +215,13 @@ def edit_medical_record(rec_id):
             'diagnosis': form.diagnosis.data,
             'prescription': form.prescription.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/medical_records/{}'.format(rec_id)
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.put(url,
-                                cookies=session_cookies,
-                                headers=headers,
-                                data=json.dumps(data)
-                                )
-        if response.status_code == 200:
-            storage.reload()
-            flash('Record updated successfully', 'success')
-            return redirect(url_for('admin.manage_patients'))
-        else:
+        try:
+            medical_record_service.update_medical_record(rec_id, data)
+        except ServiceError:
             flash('An error occurred. Please try again', 'danger')
-            return redirect(url_for('admin.manage_patients'))
+        else:
+            flash('Record updated successfully', 'success')
+        return redirect(url_for('admin.manage_patients'))
     if form.errors != {}:
         for category, error_msg in form.errors.items():
             flash(str(error_msg[0]), 'danger')
@@ -16,9 +16,12 @@ from main_app.forms import (RegistrationForm,
 from models.user import User
 from models.staff import Staff
 from flask import Blueprint
-import json
+from services import ServiceError
+from services import staff as staff_service
+from services import users
 from utilities.email import send_verification_email
-import requests
+from utilities.hashing import HashingBusy
+from utilities.user_cache import user_cache
 
 auth = Blueprint('auth', __name__)
 
@@ -38,18 +41,16 @@ def register():
             'email': form.email.data,
             'password': form.password.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/users'
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        if response.status_code == 201:
+        try:
+            new_user = users.create_user(data)
+        except ServiceError as e:
+            if e.status_code == 400:
+                flash('Username or email already in use', 'danger')
+            else:
+                flash('An error occurred. Please try again', 'danger')
+        else:
             flash('Account created successfully, check your email', 'success')
-            storage.reload()
-            user_id = response.json()['id']
-            user = storage.get(User, user_id)
+            user = storage.get(User, new_user['id'])
             subject = "Verify Your Email Address"
             # Send verification email to user
             send_verification_email(user.email, subject, user.username,
@@ -57,11 +58,6 @@ def register():
             if user:
                 login_user(user)
                 return redirect(url_for('auth.verify_email'))
-
-        elif response.status_code == 400:
-            flash('Username or email already in use', 'danger')
-        else:
-            flash('An error occurred. Please try again', 'danger')
     if form.errors != {}:
         # Display error messages to frontend
         for category, error_msg in form.errors.items():
@@ -86,18 +82,13 @@ def register_staff():
         'cell': form.cell.data,
         'user_id': current_user.id
         }
-        url = 'http://0.0.0.0:5001/api/v1/staff'
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.post(url, headers=headers, data=json.dumps(data))
-        if response.status_code == 201:
+        try:
+            staff_service.create_staff(data)
+        except ServiceError:
+            flash('An error occurred. Please try again', 'danger')
+        else:
             flash('Staff member registered successfully', 'success')
             return redirect(url_for('user_profile.profile'))
-        else:
-            flash('An error occurred. Please try again', 'danger')    
         
     return render_template('register_staff.html',
                            current_user=current_user,
@@ -117,6 +108,7 @@ def verify_email():
         user.verified = True # Change user email status to verified
         user.verification_token = None
         storage.save()
+        user_cache.invalidate(user.id)
         flash('Email verification successful!', 'success')
         return redirect(url_for('auth.register_staff'))
 
@@ -135,6 +127,13 @@ def login():
         if user is None or not user.check_password(form.password.data):
             flash('Invalid username or password', 'danger')
             return redirect(url_for('auth.login'))
+        # Upgrade the hash while the plain password is at hand
+        try:
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                storage.save()
+        except HashingBusy:
+            pass
         login_user(user)
         flash('Successfully logged in', 'success')
         if current_user.role == 'admin':
@@ -4,7 +4,8 @@ from flask import (Blueprint,
                    render_template,
                    flash, redirect, url_for, request)
 from flask_login import login_required, current_user
-import requests
+from services import ServiceError
+from services import staff as staff_service
 
 
 user_profile = Blueprint('user_profile', __name__)
@@ -15,13 +16,13 @@ user_profile = Blueprint('user_profile', __name__)
 def profile():
     """User profile"""
     id = current_user.id
-    session_cookies = request.cookies
-    url = 'http://localhost:5001/api/v1/staff/{}'.format(id)
     # Get logged in user data
-    with requests.get(url, cookies=session_cookies) as response:
-        staff = response.json()
-        if response.status_code == 404:
+    try:
+        staff = staff_service.get_staff_by_user_id(id)
+    except ServiceError as e:
+        if e.status_code == 404:
             flash('Member not found, register instead', 'danger')
             return redirect(url_for('auth.register_staff'))
+        staff = {}
     return render_template('profile.html', current_user=current_user,
                            staff=staff)
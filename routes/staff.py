@@ -7,6 +7,7 @@ from flask import (abort, Blueprint, redirect,
                    flash, request)
 from flask_login import current_user
 from utilities.decorators import staff_one_required, staff_two_required
+from utilities.query_metrics import query_budget
 from models import storage
 from main_app.forms import (SearchPatientForm,
                             AddMedicalrecordForm,
@@ -19,8 +20,12 @@ from models.patient import Patient
 from models.staff import Staff
 from models.medical_record import MedicalRecord
 from markupsafe import escape
-import json
-import requests
+from services import ServiceError
+from services import medical_records as medical_record_service
+from services import patients as patient_service
+from services import search as search_service
+from services import staff as staff_service
+from services import stats as stats_service
 
 
 staff_r = Blueprint('staff_r', __name__, url_prefix='/staff')
@@ -30,13 +35,10 @@ staff_r = Blueprint('staff_r', __name__, url_prefix='/staff')
 @staff_one_required
 def staff_dashboard():
     """Renders the staff dashboard"""
-    url = 'http://0.0.0.0:5001/api/v1/stats'
-    session_cookies = request.cookies # Get session cookies from request
-    with requests.get(url, cookies=session_cookies) as response:
-        if response.status_code == 200:
-            stats = response.json()
-        else:
-            stats = {} # No stats found
+    try:
+        stats = stats_service.get_stats()
+    except ServiceError:
+        stats = {} # No stats found
     return render_template('staff/dashboard.html', stats=stats)
 
 
@@ -49,14 +51,28 @@ def manage_patients():
     if form.validate_on_submit():
         # Handle form after validation
         id_num = form.id_number.data
-        patient = storage.get_by_id_number(Patient, id_num)
-        if patient:
-            return render_template('staff/manage_patients.html',
-                                   current_user=current_user, patient=patient,
-                                   form=form)
-        else:
+        if id_num:
+            patient = storage.get_by_id_number(Patient, id_num)
+            if patient:
+                return render_template('staff/manage_patients.html',
+                                       current_user=current_user,
+                                       patient=patient, form=form)
             flash("Patient not found, check id number and try again",
                   'danger')
+        else:
+            dob = str(form.dob.data) if form.dob.data else None
+            try:
+                results = search_service.search_patients(
+                    form.fullname.data, dob, form.sex.data or None)
+            except ServiceError as e:
+                flash(e.message, 'danger')
+            else:
+                if results['patients']:
+                    return render_template('staff/manage_patients.html',
+                                           current_user=current_user,
+                                           patients=results['patients'],
+                                           form=form)
+                flash("No patient with a similar name found", 'danger')
     if form.errors != {}:
         # Flash form errors to frontend
         for cat, msg in form.errors.items():
@@ -69,59 +85,37 @@ def manage_patients():
 @staff_r.route('/view_patient/<string:id>', methods=['GET', 'POST'],
              strict_slashes=False)
 @staff_one_required
+@query_budget(8)
 def view_patient(id):
     """Patient view"""
     id = escape(id)
     form = AddMedicalrecordForm() 
-    session_cookies = request.cookies
-    url = 'http://0.0.0.0:5001/api/v1/patients/{}'.format(id)
-    with requests.get(url, cookies=session_cookies) as response:
-        if response.status_code == 200:
-            patient = response.json()
-            if form.validate_on_submit():
-                # Get data from form
-                data = {
-                    'patient_id': id,
-                    'staff_id': storage.get_id_by_user_id('Staff',
-                                                          current_user.id),
-                    'diagnosis': form.diagnosis.data,
-                    'prescription': form.prescription.data
-                }
-                url = 'http://0.0.0.0:5001/api/v1/medical_records'
-                # Define headers for the request
-                headers = {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': request.cookies.get('csrftoken')
-                }
-                response = requests.post(url, cookies=session_cookies,
-                                          headers=headers,
-                                         data=json.dumps(data))
-                if response.status_code == 201:
-                    storage.reload()
-                    url_prefix = 'http://0.0.0.0:5001/api/v1/patients'
-                    url_postfix = '/{}/medical_records'.format(id)
-                    url = '{}{}'.format(url_prefix, url_postfix)
-                    with requests.get(url,
-                                      cookies=session_cookies) as response:
-                        if response.status_code == 200:
-                            medical_records = response.json()
-                            return render_template('staff/view_patient.html',
-                                           medical_records=medical_records,
-                                           current_user=current_user,
-                                           form=form, patient=patient)
-            url_prefix = 'http://0.0.0.0:5001/api/v1/patients'
-            url_postfix = '/{}/medical_records'.format(id)
-            url = '{}{}'.format(url_prefix, url_postfix)
-            with requests.get(url, cookies=session_cookies) as response:
-                if response.status_code == 200:
-                    medical_records = response.json()
-                    return render_template('staff/view_patient.html',
-                                   patient=patient,
-                                   medical_records=medical_records,
-                                   current_user=current_user,
-                                   form=form)
+    try:
+        # Patient, records and appointments in a fixed number of queries
+        patient = patient_service.get_patient_file(id)
+        if form.validate_on_submit():
+            # Get data from form
+            data = {
+                'patient_id': id,
+                'staff_id': storage.get_id_by_user_id('Staff',
+                                                      current_user.id),
+                'diagnosis': form.diagnosis.data,
+                'prescription': form.prescription.data
+            }
+            try:
+                patient['medical_records'].append(
+                    medical_record_service.create_medical_record(data))
+            except ServiceError:
+                flash('An error occurred. Please try again', 'danger')
+        medical_records = {'medical_records': patient['medical_records']}
+    except ServiceError:
         flash('Patient not found', 'danger')
-        return redirect(url_for('staff_r.staff_dashboard'))   
+        return redirect(url_for('staff_r.staff_dashboard'))
+    return render_template('staff/view_patient.html',
+                           patient=patient,
+                           medical_records=medical_records,
+                           current_user=current_user,
+                           form=form)
 
 
 @staff_r.route('/add_patient', methods=['GET', 'POST'])
@@ -129,7 +123,6 @@ def view_patient(id):
 def add_patient():
     """Add patient route"""
     form = AddPatientForm()
-    session_cookies = request.cookies
     if form.validate_on_submit():
         # Get data from form
         data = {
@@ -141,21 +134,13 @@ def add_patient():
         'email': form.email.data,
         'cell': form.cell.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/patients'
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.post(url,
-                                 cookies=session_cookies,
-                                 headers=headers,
-                                 data=json.dumps(data))
-        if response.status_code == 201:
-            storage.reload()
+        try:
+            patient_service.create_patient(data)
+        except ServiceError:
+            flash('An error occurred. Please try again', 'danger')
+        else:
             flash('Patient added successfully', 'success')
             return redirect(url_for('staff_r.add_patient'))
-        else:
-            flash('An error occurred. Please try again', 'danger')
     if form.errors != {}:
         for category, error_msg in form.errors.items():
             flash(str(error_msg[0]), 'danger')
@@ -168,8 +153,6 @@ def add_patient():
 def edit_patient(patient_id):
     """Edits a patient"""
     form = EditPatientForm()
-    session_cookies = request.cookies
-    print(session_cookies)
     p_id = escape(patient_id)
     patient = storage.get(Patient, p_id)
     if patient is None:
@@ -197,27 +180,20 @@ def edit_patient(patient_id):
         'email': form.email.data,
         'cell': form.cell.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/patients/{}'.format(p_id)
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.put(url, 
-                                cookies=session_cookies,
-                                headers=headers, data=json.dumps(data))
-        if response.status_code == 200:
-            storage.reload()
-            flash('Patient updated successfully', 'success')
-            return redirect(url_for('staff_r.view_patient', id=p_id))
-        elif response.status_code == 403:
-            abort(403)
-        elif response.status_code == 400:
-            flash('An auth error occured', 'danger')
-            return redirect(url_for('staff_r.edit_patient', patient_id=p_id))
-        else:
-            flash('An error occurred. Please try again', 'danger')
-            abort(500)
+        try:
+            patient_service.update_patient(p_id, data)
+        except ServiceError as e:
+            if e.status_code == 403:
+                abort(403)
+            elif e.status_code == 400:
+                flash('An auth error occured', 'danger')
+                return redirect(url_for('staff_r.edit_patient',
+                                        patient_id=p_id))
+            else:
+                flash('An error occurred. Please try again', 'danger')
+                abort(500)
+        flash('Patient updated successfully', 'success')
+        return redirect(url_for('staff_r.view_patient', id=p_id))
     if form.errors != {}:
         for category, error_msg in form.errors.items():
             flash(str(error_msg[0]), 'danger')
@@ -228,7 +204,6 @@ def edit_patient(patient_id):
 def edit_staff(staff_id):
     """Edits staff member details"""
     form = EditStaffForm()
-    session_cookies = request.cookies
     s_id = escape(staff_id)
     staff = storage.get(Staff, s_id)
     if staff is None:
@@ -258,22 +233,13 @@ def edit_staff(staff_id):
         'email': form.email.data,
         'cell': form.cell.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/staff/{}'.format(staff.id)
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.put(
-            url, headers=headers,
-            data=json.dumps(data), cookies=session_cookies
-            )
-        if response.status_code == 200:
-            storage.reload()
+        try:
+            staff_service.update_staff(staff.id, data)
+        except ServiceError:
+            flash('An error occurred. Please try again', 'danger')
+        else:
             flash('Staff updated successfully', 'success')
             return redirect(url_for('user_profile.profile', id=s_id))
-        else:
-            flash('An error occurred. Please try again', 'danger')
     if form.errors != {}:
         for category, error_msg in form.errors.items():
             flash(str(error_msg[0]), 'danger')
@@ -286,7 +252,6 @@ def edit_staff(staff_id):
 def edit_medical_record(rec_id):
     """Edits a medical record"""
     rec_id = escape(rec_id)
-    session_cookies = request.cookies
     form = EditMedicalrecordForm()
     rec = storage.get(MedicalRecord, rec_id)
     if rec is None:
@@ -304,24 +269,14 @@ def edit_medical_record(rec_id):
             'diagnosis': form.diagnosis.data,
             'prescription': form.prescription.data
         }
-        url = 'http://0.0.0.0:5001/api/v1/medical_records/{}'.format(rec_id)
-        # Define headers for the request
-        headers = {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': request.cookies.get('csrftoken')
-            }
-        response = requests.put(
-            url, headers=headers, data=json.dumps(data),
-            cookies=session_cookies
-            )
-        if response.status_code == 200:
-            storage.reload()
-            flash('Record updated successfully', 'success')
-            id = response.json().get('patient_id')
-            return redirect(url_for('staff_r.view_patient', id=id))
-        else:
+        try:
+            rec = medical_record_service.update_medical_record(rec_id, data)
+        except ServiceError:
             flash('An error occurred. Please try again', 'danger')
             return redirect(url_for('staff_r.manage_patients'))
+        flash('Record updated successfully', 'success')
+        id = rec.get('patient_id')
+        return redirect(url_for('staff_r.view_patient', id=id))
     if form.errors != {}:
         for category, error_msg in form.errors.items():
             flash(str(error_msg[0]), 'danger')
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""
+    In-process service layer shared by the api views
+    and the web routes
+
+    Services do the storage work and RBAC checks of a use case
+    and return plain dicts, so routes no longer need to call
+    the api over HTTP.
+"""
+from flask_login import current_user
+from models.serializer import serializer_for
+from utilities.decorators import has_role
+
+
+class ServiceError(Exception):
+    """Raised when a service call can't be fulfilled, carries
+    the HTTP status code the error maps to"""
+
+    def __init__(self, message, status_code=400):
+        """Stores the error message and status code"""
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def require_login():
+    """Raises a 403 ServiceError for anonymous users"""
+    if not current_user.is_authenticated:
+        raise ServiceError('Forbidden', 403)
+
+
+def require_role(roles):
+    """Raises a 403 ServiceError unless the current user
+    holds one of the passed roles"""
+    if not has_role(roles):
+        raise ServiceError('Forbidden', 403)
+
+
+def require_fields(data, fields):
+    """Raises a 400 ServiceError when data is missing
+    or lacks any of the required fields"""
+    if not data:
+        raise ServiceError('Not a JSON', 400)
+    missing_fields = [field for field in fields if field not in data]
+    if missing_fields:
+        raise ServiceError('Missing fields: ' + ', '.join(missing_fields),
+                           400)
+
+
+def projection(cls, fields=None):
+    """Returns the serializer of the requested fields of a model,
+    all of them when fields is None, and raises a 400 ServiceError
+    on fields the model doesn't have"""
+    try:
+        return serializer_for(cls, fields)
+    except ValueError as e:
+        raise ServiceError(str(e), 400)
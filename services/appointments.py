@@ -0,0 +1,276 @@
+#!/usr/bin/python3
+"""
+    Appointment use cases
+
+    Bookings for the same staff member are serialized by a per-staff
+    lock in this process and by locking the staff row in the db. The
+    db is the authority on double bookings: when the staff member's
+    in-memory calendar, an IntervalIndex of their upcoming
+    appointments, shows no clash, the db is still queried, since
+    other app processes may have booked. The index only answers the
+    clash case, which it confirms by reloading the calendar, so it
+    saves no query on the usual path. Calendars are loaded on first
+    use and kept up to date by the changes made here. Listeners
+    registered with on_change are told which stretch of a calendar
+    changed, e.g. to keep the availability bitmaps up to date.
+"""
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from models import storage
+from models.appointments import Appointment
+from models.patient import Patient
+from models.serializer import serializer_for
+from models.staff import Staff
+from services import ServiceError, require_fields, require_role
+from utilities.decorators import STAFF_ONE_ROLES
+from utilities.intervals import IntervalIndex
+
+REQUIRED_FIELDS = ['patient_id', 'staff_id', 'date']
+MOVABLE_FIELDS = ['staff_id', 'date', 'duration']
+DEFAULT_DURATION = 30
+MAX_DURATION = 8 * 60
+
+_calendars = {}
+_locks = {}
+_listeners = []
+_registry_lock = threading.Lock()
+
+
+def _get(appointment_id):
+    """Fetches an appointment or raises a 404 ServiceError"""
+    appointment = storage.get(Appointment, appointment_id)
+    if appointment is None:
+        raise ServiceError('Not Found', 404)
+    return appointment
+
+
+def _get_staff(staff_id):
+    """Fetches a staff member or raises a 404 ServiceError"""
+    staff = storage.get(Staff, staff_id)
+    if staff is None:
+        raise ServiceError('Staff member not found', 404)
+    return staff
+
+
+def _parse(data):
+    """Returns the date and duration of appointment data"""
+    try:
+        date = data['date']
+        if not isinstance(date, datetime):
+            date = datetime.fromisoformat(date)
+        duration = data.get('duration')
+        duration = DEFAULT_DURATION if duration is None else int(duration)
+    except (TypeError, ValueError):
+        raise ServiceError('Invalid date or duration', 400)
+    if date.tzinfo is not None:
+        raise ServiceError('Dates are local times without offsets', 400)
+    if not 0 < duration <= MAX_DURATION:
+        raise ServiceError('Duration must be 1 to {} minutes'
+                           .format(MAX_DURATION), 400)
+    if date < datetime.now():
+        raise ServiceError('Appointment date is in the past', 400)
+    return date.replace(microsecond=0), duration
+
+
+def _staff_lock(staff_id):
+    """Returns the lock serializing the bookings of a staff member"""
+    with _registry_lock:
+        return _locks.setdefault(staff_id, threading.Lock())
+
+
+def on_change(listener):
+    """Registers listener(staff_id, start, end), called with the
+    staff lock held after appointments in [start, end) of a staff
+    member changed, start and end are None when all may have"""
+    _listeners.append(listener)
+    return listener
+
+
+def _changed(staff_id, start=None, end=None):
+    """Notifies the listeners of a calendar change"""
+    for listener in _listeners:
+        listener(staff_id, start, end)
+
+
+def _read_calendars(staff_ids):
+    """Reads the appointments of staff members that haven't
+    ended yet into new calendars keyed by staff id"""
+    since = datetime.now() - timedelta(minutes=MAX_DURATION)
+    rows = storage.execute(
+        select(Appointment.staff_id, Appointment.id, Appointment.date,
+               Appointment.duration)
+        .where(Appointment.staff_id.in_(staff_ids),
+               Appointment.date >= since))
+    calendars = {staff_id: IntervalIndex() for staff_id in staff_ids}
+    for row in rows:
+        calendars[row.staff_id].add(
+            row.id, row.date, row.date + timedelta(minutes=row.duration))
+    return calendars
+
+
+def _load_calendar(staff_id):
+    """Reloads the calendar of a staff member from the db"""
+    calendar = _read_calendars([staff_id])[staff_id]
+    reloaded = staff_id in _calendars
+    _calendars[staff_id] = calendar
+    if reloaded:
+        _changed(staff_id)
+    return calendar
+
+
+def _calendar(staff_id):
+    """Returns the calendar of a staff member, the caller
+    holds the staff lock"""
+    calendar = _calendars.get(staff_id)
+    if calendar is None:
+        calendar = _load_calendar(staff_id)
+    return calendar
+
+
+def _db_conflicts(staff_id, start, end, ignore=None):
+    """Checks the db for appointments of a staff member
+    overlapping [start, end)"""
+    rows = storage.execute(
+        select(Appointment.id, Appointment.date, Appointment.duration)
+        .where(Appointment.staff_id == staff_id,
+               Appointment.date < end,
+               Appointment.date > start - timedelta(minutes=MAX_DURATION)))
+    return any(row.id != ignore and
+               row.date + timedelta(minutes=row.duration) > start
+               for row in rows)
+
+
+def _check_free(staff, start, end, ignore=None):
+    """Raises a 409 ServiceError when the staff member is booked
+    during [start, end), the caller holds the staff lock. A clash in
+    the calendar is confirmed by reloading it, no clash is checked
+    against the db"""
+    storage.lock(staff)
+    if _calendar(staff.id).overlapping(start, end, ignore):
+        # Another process may have moved or cancelled it since
+        if _load_calendar(staff.id).overlapping(start, end, ignore):
+            raise ServiceError('Staff member is already booked then', 409)
+    elif _db_conflicts(staff.id, start, end, ignore):
+        _load_calendar(staff.id)
+        raise ServiceError('Staff member is already booked then', 409)
+
+
+def list_appointments(limit=50, after=None):
+    """Returns a page of appointments and the next page cursor"""
+    require_role(STAFF_ONE_ROLES)
+    try:
+        rows, next_cursor = storage.page_rows(Appointment, limit, after)
+    except ValueError as e:
+        raise ServiceError(str(e), 400)
+    serializer = serializer_for(Appointment)
+    return {'appointments': [serializer.dump_row(row) for row in rows],
+            'next_cursor': next_cursor}
+
+
+def get_appointment(appointment_id):
+    """Returns one appointment"""
+    require_role(STAFF_ONE_ROLES)
+    return _get(appointment_id).to_dict()
+
+
+def get_staff_appointments(user_id, start=None, end=None):
+    """Returns the appointments of the staff member of a user in
+    date order, only the ones starting in [start, end) when given"""
+    require_role(STAFF_ONE_ROLES)
+    staff = storage.get_by_user_id(Staff, user_id)
+    if not staff:
+        raise ServiceError('Not Found', 404)
+    return [appointment.to_dict()
+            for appointment in storage.get_appointments(staff, start, end)]
+
+
+def create_appointment(data):
+    """Books an appointment with a staff member for a patient"""
+    require_role(STAFF_ONE_ROLES)
+    require_fields(data, REQUIRED_FIELDS)
+    start, duration = _parse(data)
+    end = start + timedelta(minutes=duration)
+    if storage.get(Patient, data['patient_id']) is None:
+        raise ServiceError('Patient not found', 404)
+    staff = _get_staff(data['staff_id'])
+    with _staff_lock(staff.id):
+        try:
+            _check_free(staff, start, end)
+            appointment = Appointment(patient_id=data['patient_id'],
+                                      staff_id=staff.id, date=start,
+                                      duration=duration)
+            appointment.save()
+        except Exception:
+            storage.rollback()
+            raise
+        _calendar(staff.id).add(appointment.id, start, end)
+        _changed(staff.id, start, end)
+    return appointment.to_dict()
+
+
+def move_appointment(appointment_id, data):
+    """Moves an appointment to another date, duration or
+    staff member"""
+    require_role(STAFF_ONE_ROLES)
+    if not data:
+        raise ServiceError('Not a JSON', 400)
+    for key in data:
+        if key not in MOVABLE_FIELDS:
+            raise ServiceError('Invalid field', 400)
+    appointment = _get(appointment_id)
+    old_staff_id = appointment.staff_id
+    old_start = appointment.date
+    old_end = old_start and \
+        old_start + timedelta(minutes=appointment.duration)
+    start, duration = _parse({
+        'date': data.get('date', appointment.date),
+        'duration': data.get('duration', appointment.duration)})
+    end = start + timedelta(minutes=duration)
+    staff = _get_staff(data.get('staff_id', old_staff_id))
+
+    # Lock both calendars in a fixed order when changing staff
+    staff_ids = sorted({staff.id, old_staff_id} - {None})
+    locks = [_staff_lock(staff_id) for staff_id in staff_ids]
+    for lock in locks:
+        lock.acquire()
+    try:
+        try:
+            _check_free(staff, start, end, ignore=appointment.id)
+            appointment.staff_id = staff.id
+            appointment.date = start
+            appointment.duration = duration
+            appointment.save()
+        except Exception:
+            storage.rollback()
+            raise
+        if old_staff_id in _calendars:
+            _calendars[old_staff_id].remove(appointment.id)
+        _calendar(staff.id).add(appointment.id, start, end)
+        if old_staff_id is not None and old_start is not None:
+            _changed(old_staff_id, old_start, old_end)
+        _changed(staff.id, start, end)
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+    return appointment.to_dict()
+
+
+def cancel_appointment(appointment_id):
+    """Cancels an appointment"""
+    require_role(STAFF_ONE_ROLES)
+    appointment = _get(appointment_id)
+    staff_id = appointment.staff_id
+    start = appointment.date
+    with _staff_lock(staff_id):
+        try:
+            storage.delete(appointment)
+            storage.save()
+        except Exception as e:
+            storage.rollback()
+            raise ServiceError(str(e), 400)
+        if staff_id in _calendars:
+            _calendars[staff_id].remove(appointment.id)
+        if start is not None:
+            _changed(staff_id, start,
+                     start + timedelta(minutes=appointment.duration))
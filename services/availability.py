@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+"""
+    Free slot availability of staff members
+
+    The working day of every staff member is cut into SLOT_MINUTES
+    slots and kept as a busy bitmap per staff member and day, bit i
+    set when slot i overlaps an appointment. Every bitmap is cached
+    with the fingerprint of its day, the count and latest updated_at
+    of the appointments starting that day. Each query reads the
+    fingerprints of its window in one grouped query and rebuilds
+    the bitmaps whose day changed, so bookings, moves and
+    cancellations made by other app processes are seen too. A run of
+    k free slots is found with k shifts and ands of the free bitmap,
+    and the per staff streams of free slots are merged in start
+    order.
+"""
+import heapq
+import itertools
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, select
+from models import storage
+from models.appointments import Appointment
+from models.staff import Staff
+from services import ServiceError, appointments, require_role
+from utilities.decorators import STAFF_ONE_ROLES
+
+SLOT_MINUTES = int(os.getenv('SLOT_MINUTES', '5'))
+WORKDAY_START = time.fromisoformat(os.getenv('WORKDAY_START', '08:00'))
+WORKDAY_END = time.fromisoformat(os.getenv('WORKDAY_END', '17:00'))
+WORKDAYS = {int(day) for day in os.getenv('WORKDAYS', '0,1,2,3,4').split(',')}
+DEFAULT_DAYS = 7
+MAX_DAYS = 31
+MAX_COUNT = 100
+
+_masks = {}
+_pruned = {'day': None}
+_masks_lock = threading.Lock()
+
+
+def _opening_hours(day):
+    """Returns the opening and closing time of a day"""
+    return (datetime.combine(day, WORKDAY_START),
+            datetime.combine(day, WORKDAY_END))
+
+
+def _slots_per_day():
+    """Returns the number of slots in a working day"""
+    opening, closing = _opening_hours(datetime.now().date())
+    return int((closing - opening).total_seconds() // 60) // SLOT_MINUTES
+
+
+@appointments.on_change
+def _invalidate(staff_id, start, end):
+    """Drops the bitmaps of the days a calendar change in this
+    process touched, without waiting for their fingerprints"""
+    with _masks_lock:
+        if start is None:
+            for key in [key for key in _masks if key[0] == staff_id]:
+                del _masks[key]
+            return
+        day = start.date()
+        while day <= end.date():
+            _masks.pop((staff_id, day), None)
+            day += timedelta(days=1)
+
+
+def _prune(today):
+    """Drops the bitmaps of past days, once a day"""
+    if _pruned['day'] == today:
+        return
+    with _masks_lock:
+        _pruned['day'] = today
+        for key in [key for key in _masks if key[1] < today]:
+            del _masks[key]
+
+
+def _workdays(start, end):
+    """Yields the working days from start to end"""
+    day = start.date()
+    while day <= end.date():
+        if day.weekday() in WORKDAYS:
+            yield day
+        day += timedelta(days=1)
+
+
+def _fingerprints(staff_ids, start, end):
+    """Returns the (count, latest updated_at) of the appointments
+    starting on every day from start to end by staff member and day,
+    days without appointments are left out"""
+    day = func.date(Appointment.date)
+    rows = storage.execute(
+        select(Appointment.staff_id, day, func.count(),
+               func.max(Appointment.updated_at))
+        .where(Appointment.staff_id.in_(staff_ids),
+               Appointment.date >= datetime.combine(start.date(), time.min),
+               Appointment.date < datetime.combine(
+                   end.date() + timedelta(days=1), time.min))
+        .group_by(Appointment.staff_id, day))
+    # SQLite returns the day as text, MySQL as a date
+    return {(staff_id, value if isinstance(value, date)
+             else date.fromisoformat(value)): (count, updated_at)
+            for staff_id, value, count, updated_at in rows}
+
+
+def _build_masks(keys):
+    """Returns the busy bitmaps of the (staff_id, day) keys read
+    from the db with a single query"""
+    masks = dict.fromkeys(keys, 0)
+    days = sorted({day for _, day in keys})
+    slot = timedelta(minutes=SLOT_MINUTES)
+    rows = storage.execute(
+        select(Appointment.staff_id, Appointment.date, Appointment.duration)
+        .where(Appointment.staff_id.in_({staff_id for staff_id, _ in keys}),
+               Appointment.date < _opening_hours(days[-1])[1],
+               Appointment.date > _opening_hours(days[0])[0] -
+               timedelta(minutes=appointments.MAX_DURATION)))
+    for staff_id, start, duration in rows:
+        end = start + timedelta(minutes=duration)
+        day = start.date()
+        while day <= end.date():
+            if (staff_id, day) in masks:
+                opening, closing = _opening_hours(day)
+                first = max(int((start - opening) // slot), 0)
+                last = min(-int((opening - end) // slot), _slots_per_day())
+                if last > first:
+                    masks[staff_id, day] |= \
+                        ((1 << (last - first)) - 1) << first
+            day += timedelta(days=1)
+    return masks
+
+
+def busy_masks(staff_ids, start, end):
+    """Returns the busy bitmaps of the staff members on the working
+    days from start to end keyed by (staff_id, day), rebuilding the
+    cached ones that are missing or whose day changed in the db"""
+    fingerprints = _fingerprints(staff_ids, start, end)
+    masks, stale = {}, []
+    for staff_id in staff_ids:
+        for day in _workdays(start, end):
+            key = (staff_id, day)
+            cached = _masks.get(key)
+            if cached is not None and \
+                    cached[1] == fingerprints.get(key, (0, None)):
+                masks[key] = cached[0]
+            else:
+                stale.append(key)
+    if stale:
+        built = _build_masks(stale)
+        with _masks_lock:
+            for key, mask in built.items():
+                _masks[key] = (mask, fingerprints.get(key, (0, None)))
+        masks.update(built)
+    return masks
+
+
+def _free_slots(masks, staff_id, start, end, duration):
+    """Yields the (start, staff_id) of the non overlapping free
+    runs of duration minutes of a staff member in [start, end)"""
+    needed = -(-duration // SLOT_MINUTES)
+    slot = timedelta(minutes=SLOT_MINUTES)
+    full = (1 << _slots_per_day()) - 1
+    day = start.date()
+    while day <= end.date():
+        if day.weekday() not in WORKDAYS:
+            day += timedelta(days=1)
+            continue
+        opening, closing = _opening_hours(day)
+        free = ~masks[staff_id, day] & full
+        runs = free
+        for i in range(1, needed):
+            runs &= free >> i
+        i = max(-int((opening - start) // slot), 0)
+        while True:
+            rest = runs >> i
+            if not rest:
+                break
+            i += (rest & -rest).bit_length() - 1
+            begin = opening + i * slot
+            if begin + timedelta(minutes=duration) > end:
+                return
+            yield begin, staff_id
+            i += needed
+        day += timedelta(days=1)
+
+
+def find_slots(duration=20, count=5, start=None, end=None, staff_ids=None):
+    """Returns the earliest count free slots of duration minutes
+    with any of the staff members, all of them by default, between
+    start (now) and end (start + DEFAULT_DAYS days)"""
+    require_role(STAFF_ONE_ROLES)
+    now = datetime.now().replace(second=0, microsecond=0)
+    start = max(start or now, now)
+    end = end or start + timedelta(days=DEFAULT_DAYS)
+    if end <= start or end - start > timedelta(days=MAX_DAYS):
+        raise ServiceError('The search window must be 1 minute to '
+                           '{} days'.format(MAX_DAYS), 400)
+    if not 0 < duration <= appointments.MAX_DURATION:
+        raise ServiceError('Duration must be 1 to {} minutes'
+                           .format(appointments.MAX_DURATION), 400)
+    if not 0 < count <= MAX_COUNT:
+        raise ServiceError('Count must be 1 to {}'.format(MAX_COUNT), 400)
+    statement = select(Staff.id)
+    if staff_ids is not None:
+        statement = statement.where(Staff.id.in_(staff_ids))
+    staff_ids = storage.execute(statement).scalars().all()
+    _prune(now.date())
+    masks = busy_masks(staff_ids, start, end) if staff_ids else {}
+    slots = heapq.merge(*[_free_slots(masks, staff_id, start, end,
+                                      duration)
+                          for staff_id in staff_ids])
+    return {'slots': [{'staff_id': staff_id,
+                       'start': begin.isoformat(),
+                       'end': (begin + timedelta(minutes=duration))
+                       .isoformat()}
+                      for begin, staff_id in itertools.islice(slots, count)]}
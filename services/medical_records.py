@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""Medical record use cases"""
+from models import storage
+from models.medical_record import MedicalRecord
+from services import (ServiceError, projection, require_fields,
+                      require_role)
+from services import search
+from utilities.decorators import STAFF_TWO_ROLES
+
+REQUIRED_FIELDS = ['patient_id', 'staff_id', 'diagnosis', 'prescription']
+IGNORED_FIELDS = ['id', 'created_at', 'updated_at']
+
+
+def _get(rec_id):
+    """Fetches a medical record or raises a 404 ServiceError"""
+    medical_record = storage.get(MedicalRecord, rec_id)
+    if medical_record is None:
+        raise ServiceError('Not Found', 404)
+    return medical_record
+
+
+def list_medical_records(limit=50, after=None, fields=None):
+    """Returns a page of medical records and the next page cursor,
+    only reading the passed fields when given"""
+    require_role(STAFF_TWO_ROLES)
+    serializer = projection(MedicalRecord, fields)
+    try:
+        rows, next_cursor = storage.page_rows(MedicalRecord, limit, after,
+                                              serializer.fields)
+    except ValueError as e:
+        raise ServiceError(str(e), 400)
+    return {'medical_records': [serializer.dump_row(row) for row in rows],
+            'next_cursor': next_cursor}
+
+
+def iter_medical_records(chunk_size=1000, fields=None):
+    """Returns a generator over every medical record, read from
+    the db chunk_size rows at a time"""
+    require_role(STAFF_TWO_ROLES)
+    serializer = projection(MedicalRecord, fields)
+    return (serializer.dump_row(row)
+            for row in storage.iterate_rows(MedicalRecord, chunk_size,
+                                            serializer.fields))
+
+
+def get_medical_record(rec_id, fields=None):
+    """Returns one medical record, only reading the passed fields
+    when given"""
+    require_role(STAFF_TWO_ROLES)
+    if fields is None:
+        return _get(rec_id).to_dict()
+    serializer = projection(MedicalRecord, fields)
+    row = storage.get_row(MedicalRecord, rec_id, serializer.fields)
+    if row is None:
+        raise ServiceError('Not Found', 404)
+    return serializer.dump_row(row)
+
+
+def create_medical_record(data):
+    """Creates a medical record from data"""
+    require_role(STAFF_TWO_ROLES)
+    require_fields(data, REQUIRED_FIELDS)
+    try:
+        new_medical_record = MedicalRecord(**data)
+        new_medical_record.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    search.index_medical_record(new_medical_record)
+    return new_medical_record.to_dict()
+
+
+def update_medical_record(rec_id, data):
+    """Updates a medical record from data"""
+    require_role(STAFF_TWO_ROLES)
+    if not data:
+        raise ServiceError('Not a JSON', 400)
+    medical_record = _get(rec_id)
+    try:
+        for key, value in data.items():
+            if key not in IGNORED_FIELDS:
+                setattr(medical_record, key, value)
+        medical_record.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    search.index_medical_record(medical_record)
+    return medical_record.to_dict()
+
+
+def delete_medical_record(rec_id):
+    """Deletes a medical record"""
+    require_role(STAFF_TWO_ROLES)
+    medical_record = _get(rec_id)
+    try:
+        search.unindex_medical_record(medical_record.id, commit=False)
+        storage.delete(medical_record)
+        storage.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
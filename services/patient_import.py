@@ -0,0 +1,183 @@
+#!/usr/bin/python3
+"""
+    Bulk patient import
+
+    Reads patients from a JSON array, NDJSON or CSV stream, validates
+    every row against the fields create_patient requires and inserts
+    valid rows in batches with one commit per batch. Invalid rows are
+    reported back without aborting the load.
+
+    Usage: python -m services.patient_import FILE [--format FMT]
+           [--batch-size N]
+"""
+import csv
+import json
+import uuid
+from datetime import datetime
+from models import storage
+from models.patient import Patient
+from services import ServiceError, require_role, search
+from services.patients import REQUIRED_FIELDS
+from utilities.decorators import STAFF_ONE_ROLES
+
+FORMATS = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'text/csv': 'csv'
+}
+COLUMNS = ['fullname', 'id_number', 'dob', 'sex', 'address', 'email', 'cell']
+BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+READ_SIZE = 65536
+
+
+def _json_array_rows(stream):
+    """Yields the elements of a JSON array one at a time
+    without reading the whole stream into memory"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    for chunk in iter(lambda: stream.read(READ_SIZE), ''):
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer:
+                    break
+                if buffer[0] != '[':
+                    raise ValueError('Expected a JSON array')
+                buffer = buffer[1:]
+                started = True
+            elif buffer.startswith(','):
+                buffer = buffer[1:]
+            elif buffer.startswith(']'):
+                return
+            else:
+                try:
+                    row, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    break  # Wait for the rest of the element
+                yield row
+                buffer = buffer[end:]
+    raise ValueError('Unterminated JSON array')
+
+
+def _ndjson_rows(stream):
+    """Yields one decoded row per non empty line, or the
+    decoding error of a malformed line"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError('Invalid JSON: {}'.format(e))
+
+
+def parse_rows(stream, fmt):
+    """Returns an iterator of rows read from a text stream in
+    the json, ndjson or csv format"""
+    if fmt == 'json':
+        return _json_array_rows(stream)
+    if fmt == 'ndjson':
+        return _ndjson_rows(stream)
+    if fmt == 'csv':
+        return csv.DictReader(stream)
+    raise ServiceError('Unsupported import format', 400)
+
+
+def validate_row(row):
+    """Turns a raw row into patient column values, raises
+    ValueError describing the first problem found"""
+    if isinstance(row, Exception):
+        raise row
+    if not isinstance(row, dict):
+        raise ValueError('Row is not an object')
+    missing_fields = [field for field in REQUIRED_FIELDS
+                      if row.get(field) in (None, '')]
+    if missing_fields:
+        raise ValueError('Missing fields: ' + ', '.join(missing_fields))
+    values = {column: row.get(column) or None for column in COLUMNS}
+    try:
+        values['dob'] = datetime.fromisoformat(str(values['dob']))
+    except ValueError:
+        raise ValueError('Invalid dob')
+    if values['cell'] is not None:
+        values['cell'] = str(values['cell'])
+    now = datetime.now()
+    values.update(id=str(uuid.uuid4()), created_at=now, updated_at=now)
+    return values
+
+
+def _insert(rows):
+    """Inserts patients and their name trigrams in one transaction"""
+    storage.bulk_insert(Patient, rows, commit=False)
+    search.index_patients(rows, commit=False)
+    storage.save()
+
+
+def _flush(batch, summary):
+    """Inserts a batch with one commit, falling back to one
+    commit per row to single out the rows the db rejects"""
+    try:
+        _insert([values for _, values in batch])
+        summary['imported'] += len(batch)
+        return
+    except Exception:
+        storage.rollback()
+    for number, values in batch:
+        try:
+            _insert([values])
+            summary['imported'] += 1
+        except Exception as e:
+            storage.rollback()
+            summary['errors'].append({'row': number,
+                                      'error': str(e.__cause__ or e)})
+
+
+def load_patients(rows, batch_size=BATCH_SIZE):
+    """Validates and inserts rows batch_size at a time and
+    returns a summary with the errors of rejected rows"""
+    summary = {'imported': 0, 'errors': []}
+    batch = []
+    number = 0
+    try:
+        for number, row in enumerate(rows, start=1):
+            try:
+                batch.append((number, validate_row(row)))
+            except ValueError as e:
+                summary['errors'].append({'row': number, 'error': str(e)})
+            if len(batch) >= batch_size:
+                _flush(batch, summary)
+                batch = []
+    except ValueError as e:
+        # The stream itself is malformed, keep what was read so far
+        summary['errors'].append({'row': number + 1, 'error': str(e)})
+    if batch:
+        _flush(batch, summary)
+    summary['failed'] = len(summary['errors'])
+    return summary
+
+
+def import_patients(stream, fmt, batch_size=BATCH_SIZE):
+    """Imports patients from a text stream for the current user"""
+    require_role(STAFF_ONE_ROLES)
+    if not 1 <= batch_size <= MAX_BATCH_SIZE:
+        raise ServiceError('Invalid batch_size', 400)
+    return load_patients(parse_rows(stream, fmt), batch_size)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Bulk import patients')
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=['json', 'ndjson', 'csv'])
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    extension = args.file.rsplit('.', 1)[-1].lower()
+    fmt = args.format or {'jsonl': 'ndjson'}.get(extension, extension)
+    with open(args.file, newline='', encoding='utf-8') as f:
+        summary = load_patients(parse_rows(f, fmt), args.batch_size)
+    print(json.dumps(summary, indent=2))
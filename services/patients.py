@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+"""Patient use cases"""
+from models import storage
+from models.serializer import Serialized, serializer_for
+from models.appointments import Appointment
+from models.medical_record import MedicalRecord
+from models.patient import Patient
+from services import (ServiceError, projection, require_fields,
+                      require_role)
+from services import search
+from utilities.decorators import STAFF_ONE_ROLES
+
+REQUIRED_FIELDS = ['fullname', 'id_number', 'dob', 'sex', 'address']
+IGNORED_FIELDS = ['id', 'created_at', 'updated_at']
+MAX_LATEST_RECORDS = 20
+
+
+def _get(patient_id):
+    """Fetches a patient or raises a 404 ServiceError"""
+    patient = storage.get(Patient, patient_id)
+    if patient is None:
+        raise ServiceError('Not Found', 404)
+    return patient
+
+
+def list_patients(limit=50, after=None, latest_records=0, counts=False,
+                  fields=None):
+    """Returns a page of patients and the next page cursor, with
+    the latest_records latest medical records of every patient
+    and their record and appointment counts when asked, the
+    page always takes a fixed number of queries. Only the passed
+    fields of the patients are read when given"""
+    require_role(STAFF_ONE_ROLES)
+    if not 0 <= latest_records <= MAX_LATEST_RECORDS:
+        raise ServiceError('latest_records must be 0 to {}'
+                           .format(MAX_LATEST_RECORDS), 400)
+    serializer = projection(Patient, fields)
+    try:
+        rows, next_cursor = storage.page_rows(Patient, limit, after,
+                                              serializer.fields)
+    except ValueError as e:
+        raise ServiceError(str(e), 400)
+    patients = [serializer.dump_row(row) for row in rows]
+    ids = [patient['id'] for patient in patients]
+    if ids and latest_records:
+        record_serializer = serializer_for(MedicalRecord)
+        latest = storage.latest_rows(MedicalRecord, 'patient_id', ids,
+                                     latest_records)
+        for patient in patients:
+            patient['latest_medical_records'] = [
+                record_serializer.dump_row(row)
+                for row in latest[patient['id']]]
+    if ids and counts:
+        records = storage.count_by(MedicalRecord, 'patient_id', ids)
+        appointments = storage.count_by(Appointment, 'patient_id', ids)
+        for patient in patients:
+            patient['medical_record_count'] = records[patient['id']]
+            patient['appointment_count'] = appointments[patient['id']]
+    return {'patients': patients, 'next_cursor': next_cursor}
+
+
+def iter_patients(chunk_size=1000, fields=None):
+    """Returns a generator over every patient, read from the
+    db chunk_size rows at a time"""
+    require_role(STAFF_ONE_ROLES)
+    serializer = projection(Patient, fields)
+    return (serializer.dump_row(row)
+            for row in storage.iterate_rows(Patient, chunk_size,
+                                            serializer.fields))
+
+
+def get_patient(patient_id, fields=None):
+    """Returns one patient, only reading the passed fields
+    when given"""
+    require_role(STAFF_ONE_ROLES)
+    if fields is None:
+        return _get(patient_id).to_dict()
+    serializer = projection(Patient, fields)
+    row = storage.get_row(Patient, patient_id, serializer.fields)
+    if row is None:
+        raise ServiceError('Not Found', 404)
+    return serializer.dump_row(row)
+
+
+def get_medical_records_version(patient_id):
+    """Returns values that change whenever the patient or one
+    of their medical records changes, without loading the records"""
+    require_role(STAFF_ONE_ROLES)
+    patient = _get(patient_id)
+    return (patient.id, patient.updated_at) + \
+        storage.fingerprint(MedicalRecord, patient_id=patient.id)
+
+
+def get_patient_medical_records(patient_id):
+    """Returns the medical records of one patient"""
+    require_role(STAFF_ONE_ROLES)
+    patient = storage.get_loaded(Patient, patient_id, 'medical_records')
+    if patient is None:
+        raise ServiceError('Not Found', 404)
+    return {'medical_records': [record.to_dict()
+                                for record in patient.medical_records]}
+
+
+def get_patient_file(patient_id):
+    """Returns one patient with their medical records and
+    appointments, loaded in three queries"""
+    require_role(STAFF_ONE_ROLES)
+    patient = storage.get_loaded(Patient, patient_id,
+                                 'medical_records', 'appointments')
+    if patient is None:
+        raise ServiceError('Not Found', 404)
+    data = patient.to_dict()
+    data['medical_records'] = [record.to_dict()
+                               for record in patient.medical_records]
+    data['appointments'] = [appointment.to_dict()
+                            for appointment in patient.appointments]
+    return data
+
+
+def get_patient_timeline(patient_id, limit=50, after=None,
+                         descending=False):
+    """Returns one patient with a page of their medical records and
+    appointments merged in time order, with the treating staff
+    member's name, and the next page cursor, in two queries"""
+    require_role(STAFF_ONE_ROLES)
+    patient = _get(patient_id)
+    try:
+        rows, next_cursor = storage.timeline(patient.id, limit, after,
+                                             descending)
+    except ValueError as e:
+        raise ServiceError(str(e), 400)
+    timeline = []
+    for row in rows:
+        entry = Serialized(type=row.kind, id=row.id,
+                           at=row.at.isoformat(' ', 'seconds'),
+                           staff_id=row.staff_id,
+                           staff_name=row.staff_name)
+        entry.version = row.updated_at
+        if row.kind == 'medical_record':
+            entry.update(diagnosis=row.diagnosis,
+                         prescription=row.prescription)
+        else:
+            entry['duration'] = row.duration
+        entry['created_at'] = row.created_at.isoformat(' ', 'seconds')
+        entry['updated_at'] = row.updated_at.isoformat(' ', 'seconds')
+        timeline.append(entry)
+    return {'patient': patient.to_dict(), 'timeline': timeline,
+            'next_cursor': next_cursor}
+
+
+def create_patient(data):
+    """Creates a patient from data"""
+    require_role(STAFF_ONE_ROLES)
+    require_fields(data, REQUIRED_FIELDS)
+    try:
+        new_patient = Patient(**data)
+        new_patient.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    search.index_patients([new_patient])
+    return new_patient.to_dict()
+
+
+def update_patient(patient_id, data):
+    """Updates a patient's details from data"""
+    require_role(STAFF_ONE_ROLES)
+    patient = _get(patient_id)
+    if not data:
+        raise ServiceError('Not a JSON', 400)
+    try:
+        for k, v in data.items():
+            if k not in IGNORED_FIELDS:
+                setattr(patient, k, v)
+        patient.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    if 'fullname' in data:
+        search.index_patients([patient])
+    return patient.to_dict()
+
+
+def delete_patient(patient_id):
+    """Deletes a patient and their records"""
+    require_role(STAFF_ONE_ROLES)
+    patient = _get(patient_id)
+    try:
+        search.unindex_patient(patient.id, commit=False)
+        storage.delete(patient)
+        storage.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
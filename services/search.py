@@ -0,0 +1,342 @@
+#!/usr/bin/python3
+"""
+    Full text search over medical records and fuzzy patient name search
+
+    Diagnosis and prescription text is tokenized into terms kept in an
+    inverted index table (medical_record_terms) with one weighted
+    posting per term and record. Query terms are prefix matched with
+    range scans on the term primary key, records must match every
+    query term and are ranked by tf-idf.
+
+    Patient names are split into trigrams kept in patient_name_trigrams.
+    Candidates are read from the rarest query trigrams only, counted
+    against the others and ranked by trigram similarity, so misspelled
+    names still match. Both indexes are updated when records and
+    patients are written through the services.
+
+    Usage: python -m services.search rebuild
+"""
+import math
+import re
+import time
+import unicodedata
+from datetime import datetime
+from sqlalchemy import and_, case, delete, func, insert, select
+from models import storage
+from models.medical_record import MedicalRecord
+from models.patient import Patient
+from models.search_index import MedicalRecordTerm, PatientNameTrigram
+from models.serializer import serializer_for
+from services import ServiceError, require_role
+from utilities.decorators import STAFF_ONE_ROLES, STAFF_TWO_ROLES
+
+FIELD_WEIGHTS = {'diagnosis': 2, 'prescription': 1}
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+MAX_CANDIDATES = 20000
+COUNT_TTL = 60
+SIMILARITY = 0.3
+MAX_NAME_LENGTH = 100
+MAX_NAME_POSTINGS = 5000
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has',
+    'in', 'is', 'it', 'of', 'on', 'or', 'that', 'the', 'to', 'was', 'with'
+])
+_word = re.compile(r'[a-z0-9]+')
+_count_cache = {'value': None, 'expires': 0}
+
+
+def normalize(text):
+    """Lowercases text and strips accents"""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Splits text into index terms, skipping stopwords and
+    terms too short to be useful"""
+    return [word[:MAX_TERM_LENGTH] for word in _word.findall(normalize(text))
+            if len(word) >= MIN_TERM_LENGTH and word not in STOPWORDS]
+
+
+def record_terms(record):
+    """Returns the weighted term frequencies of a medical record"""
+    weights = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(getattr(record, field)):
+            weights[term] = weights.get(term, 0) + weight
+    return weights
+
+
+def _postings(record):
+    """Returns the index rows of a medical record"""
+    return [{'term': term, 'record_id': record.id, 'weight': weight}
+            for term, weight in record_terms(record).items()]
+
+
+def index_medical_record(record, commit=True):
+    """Replaces the postings of a medical record in the index"""
+    storage.execute(delete(MedicalRecordTerm)
+                    .where(MedicalRecordTerm.record_id == record.id))
+    rows = _postings(record)
+    if rows:
+        storage.execute(insert(MedicalRecordTerm), rows)
+    if commit:
+        storage.save()
+
+
+def unindex_medical_record(record_id, commit=True):
+    """Removes the postings of a medical record from the index"""
+    storage.execute(delete(MedicalRecordTerm)
+                    .where(MedicalRecordTerm.record_id == record_id))
+    if commit:
+        storage.save()
+
+
+def _prefix_range(prefix):
+    """Returns the condition matching every term starting with
+    prefix as a range the term index can seek"""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(MedicalRecordTerm.term >= prefix,
+                MedicalRecordTerm.term < upper)
+
+
+def _record_count():
+    """Returns the number of medical records, refreshed at most
+    every COUNT_TTL seconds"""
+    if _count_cache['expires'] < time.monotonic():
+        _count_cache['value'] = storage.count(MedicalRecord)
+        _count_cache['expires'] = time.monotonic() + COUNT_TTL
+    return _count_cache['value']
+
+
+def search_medical_records(query, limit=20):
+    """Returns the medical records matching every term of the query,
+    each term matching as a prefix, best tf-idf score first. Only the
+    MAX_CANDIDATES best postings of the rarest prefix are considered,
+    truncated tells when that cap was hit"""
+    require_role(STAFF_TWO_ROLES)
+    prefixes = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not prefixes:
+        raise ServiceError('Missing search terms', 400)
+    total = max(_record_count() or 0, 1)
+
+    # Document frequencies of every term each prefix expands to
+    frequencies = {}
+    for prefix in prefixes:
+        rows = storage.execute(
+            select(MedicalRecordTerm.term, func.count())
+            .where(_prefix_range(prefix))
+            .group_by(MedicalRecordTerm.term)).all()
+        frequencies[prefix] = dict(rows)
+        if not rows:
+            return {'query': query, 'medical_records': [],
+                    'truncated': False}
+    idf = {term: math.log(1 + total / df)
+           for terms in frequencies.values() for term, df in terms.items()}
+
+    # Walk the prefixes from the most selective one, intersecting
+    scores = None
+    truncated = False
+    for prefix in sorted(prefixes, key=lambda p: sum(frequencies[p].values())):
+        statement = select(MedicalRecordTerm.record_id,
+                           MedicalRecordTerm.term, MedicalRecordTerm.weight)\
+            .where(_prefix_range(prefix))
+        if scores is not None:
+            statement = statement.where(
+                MedicalRecordTerm.record_id.in_(list(scores)))
+        elif sum(frequencies[prefix].values()) > MAX_CANDIDATES:
+            # Keep the best scoring postings rather than arbitrary ones
+            truncated = True
+            statement = statement.order_by(
+                (MedicalRecordTerm.weight *
+                 case({term: idf[term] for term in frequencies[prefix]},
+                      value=MedicalRecordTerm.term)).desc())\
+                .limit(MAX_CANDIDATES)
+        best = {}
+        for record_id, term, weight in storage.execute(statement):
+            score = weight * idf[term]
+            if score > best.get(record_id, 0):
+                best[record_id] = score
+        if scores is None:
+            scores = best
+        else:
+            scores = {record_id: scores[record_id] + score
+                      for record_id, score in best.items()}
+        if not scores:
+            break
+
+    ranked = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+    if not ranked:
+        return {'query': query, 'medical_records': [],
+                'truncated': truncated}
+    rows = storage.execute(
+        select(MedicalRecord.__table__)
+        .where(MedicalRecord.id.in_([record_id for record_id, _ in ranked])))
+    serializer = serializer_for(MedicalRecord)
+    records = {row.id: serializer.dump_row(row) for row in rows}
+    results = []
+    for record_id, score in ranked:
+        if record_id in records:
+            records[record_id]['score'] = round(score, 4)
+            results.append(records[record_id])
+    return {'query': query, 'medical_records': results,
+            'truncated': truncated}
+
+
+def trigrams(name):
+    """Returns the set of trigrams of a name, every word padded
+    with two leading and one trailing space"""
+    grams = set()
+    for word in _word.findall(normalize(name)[:MAX_NAME_LENGTH]):
+        word = '  {} '.format(word)
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+
+def similarity(grams, other):
+    """Returns the share of trigrams two names have in common"""
+    if not grams or not other:
+        return 0
+    shared = len(grams & other)
+    return shared / (len(grams) + len(other) - shared)
+
+
+def _name_rows(patient_id, name):
+    """Returns the index rows of a patient name"""
+    return [{'trigram': gram, 'patient_id': patient_id}
+            for gram in trigrams(name)]
+
+
+def index_patients(patients, commit=True):
+    """Replaces the name trigrams of patients given as models or
+    dicts with an id and a fullname"""
+    rows, ids = [], []
+    for patient in patients:
+        if isinstance(patient, dict):
+            patient_id, name = patient['id'], patient['fullname']
+        else:
+            patient_id, name = patient.id, patient.fullname
+        ids.append(patient_id)
+        rows.extend(_name_rows(patient_id, name))
+    if not ids:
+        return
+    storage.execute(delete(PatientNameTrigram)
+                    .where(PatientNameTrigram.patient_id.in_(ids)))
+    if rows:
+        storage.execute(insert(PatientNameTrigram), rows)
+    if commit:
+        storage.save()
+
+
+def unindex_patient(patient_id, commit=True):
+    """Removes the name trigrams of a patient from the index"""
+    storage.execute(delete(PatientNameTrigram)
+                    .where(PatientNameTrigram.patient_id == patient_id))
+    if commit:
+        storage.save()
+
+
+def search_patients(name, dob=None, sex=None, limit=20):
+    """Returns the patients whose name is similar to name, most
+    similar first, optionally filtered by dob (YYYY-MM-DD) and sex"""
+    require_role(STAFF_ONE_ROLES)
+    grams = trigrams(name)
+    if not grams:
+        raise ServiceError('Missing name', 400)
+    if dob:
+        try:
+            dob = datetime.strptime(dob, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ServiceError('Invalid dob', 400)
+
+    # A match shares at least `needed` trigrams with the query, so it
+    # holds one of any len(grams) - needed + 1 of them: candidates are
+    # read from the rarest ones, stopping early on very common trigrams
+    needed = max(math.ceil(SIMILARITY * len(grams)), 1)
+    frequencies = dict(storage.execute(
+        select(PatientNameTrigram.trigram, func.count())
+        .where(PatientNameTrigram.trigram.in_(grams))
+        .group_by(PatientNameTrigram.trigram)).all())
+    rare, postings = [], 0
+    for gram in sorted(frequencies, key=frequencies.get):
+        if len(rare) > len(grams) - needed or \
+                (rare and postings + frequencies[gram] > MAX_NAME_POSTINGS):
+            break
+        rare.append(gram)
+        postings += frequencies[gram]
+    if not rare:
+        return {'query': name, 'patients': []}
+    candidates = select(PatientNameTrigram.patient_id)\
+        .where(PatientNameTrigram.trigram.in_(rare))
+
+    # Count the query trigrams every candidate shares and only
+    # load the best ones that can still reach the threshold
+    shared = func.count().label('shared')
+    statement = select(PatientNameTrigram.patient_id, shared)\
+        .where(PatientNameTrigram.trigram.in_(grams),
+               PatientNameTrigram.patient_id.in_(candidates))
+    if dob or sex:
+        statement = statement.join(
+            Patient, Patient.id == PatientNameTrigram.patient_id)
+        if dob:
+            statement = statement.where(Patient.dob == dob)
+        if sex:
+            statement = statement.where(Patient.sex == sex)
+    matches = storage.execute(
+        statement.group_by(PatientNameTrigram.patient_id)
+        .having(shared >= needed)
+        .order_by(shared.desc())
+        .limit(limit * 10)).all()
+    if not matches:
+        return {'query': name, 'patients': []}
+    rows = storage.execute(select(Patient.__table__).where(
+        Patient.id.in_([patient_id for patient_id, _ in matches])))
+
+    serializer = serializer_for(Patient)
+    results = []
+    for row in rows:
+        score = similarity(grams, trigrams(row.fullname))
+        if score >= SIMILARITY:
+            patient = serializer.dump_row(row)
+            patient['score'] = round(score, 4)
+            results.append(patient)
+    results.sort(key=lambda patient: -patient['score'])
+    return {'query': name, 'patients': results[:limit]}
+
+
+def rebuild(chunk_size=1000):
+    """Rebuilds the medical record and patient name indexes,
+    returns the number of records and patients indexed"""
+    storage.execute(delete(MedicalRecordTerm))
+    storage.execute(delete(PatientNameTrigram))
+    storage.save()
+    indexed = {'medical_records': 0, 'patients': 0}
+    for cls, table, rows_of in [
+            (MedicalRecord, MedicalRecordTerm, _postings),
+            (Patient, PatientNameTrigram,
+             lambda row: _name_rows(row.id, row.fullname))]:
+        batch = []
+        count = 0
+        for row in storage.iterate_rows(cls, chunk_size):
+            batch.extend(rows_of(row))
+            count += 1
+            if count % chunk_size == 0 and batch:
+                storage.execute(insert(table), batch)
+                batch = []
+        if batch:
+            storage.execute(insert(table), batch)
+        storage.save()
+        indexed[cls.__tablename__] = count
+    return indexed
+
+
+if __name__ == '__main__':
+    import sys
+
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('Usage: python -m services.search rebuild')
+    indexed = rebuild()
+    print('Indexed {medical_records} medical records and '
+          '{patients} patients'.format(**indexed))
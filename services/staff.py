@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+"""Staff use cases"""
+from models import storage
+from models.appointments import Appointment
+from models.staff import Staff
+from models.user import User
+from services import (ServiceError, projection, require_fields,
+                      require_login, require_role)
+from utilities.decorators import ADMIN_ROLES, STAFF_ONE_ROLES
+
+REQUIRED_FIELDS = ['user_id', 'fullname', 'id_number', 'dob',
+                   'sex', 'address', 'email', 'cell']
+EDITABLE_FIELDS = ['fullname', 'id_number', 'dob',
+                   'sex', 'address', 'email', 'cell']
+
+
+def _get_by_user_id(user_id):
+    """Fetches the staff member of a user or raises
+    a 404 ServiceError"""
+    staff = storage.get_by_user_id(Staff, user_id)
+    if not staff:
+        raise ServiceError('Not Found', 404)
+    return staff
+
+
+def list_staff(limit=50, after=None, counts=False, fields=None):
+    """Returns a page of staff members and the next page cursor,
+    with their appointment counts when asked. Only the passed
+    fields are read when given"""
+    require_role(STAFF_ONE_ROLES)
+    serializer = projection(Staff, fields)
+    try:
+        rows, next_cursor = storage.page_rows(Staff, limit, after,
+                                              serializer.fields)
+    except ValueError as e:
+        raise ServiceError(str(e), 400)
+    staff = [serializer.dump_row(row) for row in rows]
+    if staff and counts:
+        appointments = storage.count_by(Appointment, 'staff_id',
+                                        [member['id'] for member in staff])
+        for member in staff:
+            member['appointment_count'] = appointments[member['id']]
+    return {'staff': staff, 'next_cursor': next_cursor}
+
+
+def iter_staff(chunk_size=1000, fields=None):
+    """Returns a generator over every staff member, read from
+    the db chunk_size rows at a time"""
+    require_role(STAFF_ONE_ROLES)
+    serializer = projection(Staff, fields)
+    return (serializer.dump_row(row)
+            for row in storage.iterate_rows(Staff, chunk_size,
+                                            serializer.fields))
+
+
+def get_staff_by_user_id(user_id, fields=None):
+    """Returns the staff member details of a user, only reading
+    the passed fields when given"""
+    require_role(STAFF_ONE_ROLES)
+    if fields is None:
+        return _get_by_user_id(user_id).to_dict()
+    serializer = projection(Staff, fields)
+    row = storage.get_row(Staff, user_id, serializer.fields, 'user_id')
+    if row is None:
+        raise ServiceError('Not Found', 404)
+    return serializer.dump_row(row)
+
+
+def create_staff(data):
+    """Creates a staff member associated with a user"""
+    require_login()
+    require_fields(data, REQUIRED_FIELDS)
+    if not storage.get(User, data['user_id']):
+        raise ServiceError('Not Found', 404)
+    try:
+        new_staff = Staff(**data)
+        new_staff.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    return new_staff.to_dict()
+
+
+def update_staff(staff_id, data):
+    """Updates a staff member's details"""
+    require_role(STAFF_ONE_ROLES)
+    staff = storage.get(Staff, staff_id)
+    if not staff:
+        raise ServiceError('Not Found', 404)
+    if not data:
+        raise ServiceError('Not a JSON', 400)
+    for key in data:
+        if key not in EDITABLE_FIELDS:
+            raise ServiceError('Invalid field', 400)
+    try:
+        for key, value in data.items():
+            setattr(staff, key, value)
+        storage.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    return staff.to_dict()
+
+
+def delete_staff(user_id):
+    """Deletes the staff member of a user"""
+    require_role(ADMIN_ROLES)
+    staff = _get_by_user_id(user_id)
+    try:
+        storage.delete(staff)
+        storage.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+"""Dashboard statistics use cases"""
+from models import storage
+from models.engine import pool_metrics
+from services import require_role
+from utilities.decorators import ADMIN_ROLES, STAFF_ONE_ROLES
+
+
+def get_stats(since=None):
+    """Counts every object type in one round trip, only counting
+    objects created from since when given"""
+    require_role(STAFF_ONE_ROLES)
+    counts = storage.counts('Patient', 'Staff', 'MedicalRecord',
+                            'Appointment', 'User', since=since)
+    return {
+        'patients': counts['Patient'],
+        'staff': counts['Staff'],
+        'medical_records': counts['MedicalRecord'],
+        'appointments': counts['Appointment'],
+        'users': counts['User']
+    }
+
+
+def get_pool_metrics():
+    """Returns the connection pool metrics of the primary db
+    and of every replica with its health"""
+    require_role(ADMIN_ROLES)
+    replicas = []
+    if storage.replicas is not None:
+        for engine, status in zip(storage.replicas.engines,
+                                  storage.replicas.status()):
+            status.update(pool_metrics.snapshot(engine))
+            replicas.append(status)
+    return {'primary': pool_metrics.snapshot(storage.engine),
+            'replicas': replicas}
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+"""User use cases"""
+from models import storage
+from models.user import User
+from services import (ServiceError, projection, require_fields,
+                      require_login, require_role)
+from utilities.decorators import ADMIN_ROLES
+from utilities.hashing import HashingBusy
+from utilities.user_cache import user_cache
+
+REQUIRED_FIELDS = ['username', 'email', 'password']
+
+
+def _get(user_id):
+    """Fetches a user or raises a 404 ServiceError"""
+    user = storage.get(User, user_id)
+    if not user:
+        raise ServiceError('Not Found', 404)
+    return user
+
+
+def list_users(limit=50, after=None, fields=None):
+    """Returns a page of users and the next page cursor, only
+    reading the passed fields when given"""
+    require_role(ADMIN_ROLES)
+    serializer = projection(User, fields)
+    try:
+        rows, next_cursor = storage.page_rows(User, limit, after,
+                                              serializer.fields)
+    except ValueError as e:
+        raise ServiceError(str(e), 400)
+    return {'users': [serializer.dump_row(row) for row in rows],
+            'next_cursor': next_cursor}
+
+
+def iter_users(chunk_size=1000, fields=None):
+    """Returns a generator over every user, read from the db
+    chunk_size rows at a time"""
+    require_role(ADMIN_ROLES)
+    serializer = projection(User, fields)
+    return (serializer.dump_row(row)
+            for row in storage.iterate_rows(User, chunk_size,
+                                            serializer.fields))
+
+
+def get_user(user_id, fields=None):
+    """Returns one user, only reading the passed fields
+    when given"""
+    require_login()
+    if fields is None:
+        return _get(user_id).to_dict()
+    serializer = projection(User, fields)
+    row = storage.get_row(User, user_id, serializer.fields)
+    if row is None:
+        raise ServiceError('Not Found', 404)
+    return serializer.dump_row(row)
+
+
+def create_user(data):
+    """Registers a new unverified user"""
+    require_fields(data, REQUIRED_FIELDS)
+    if storage.check_username(data['username']) or \
+            storage.check_email(data['email']):
+        raise ServiceError('Username or email already in use', 400)
+    new_user = User(username=data['username'], email=data['email'])
+    try:
+        new_user.set_password(data['password'])
+    except HashingBusy as e:
+        raise ServiceError(str(e), 503)
+    new_user.verification_token = new_user.generate_verification_token()
+    try:
+        storage.new(new_user)
+        storage.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    return new_user.to_dict()
+
+
+def update_user(user_id, data):
+    """Updates a user's username, email or password hash"""
+    require_login()
+    if not data:
+        raise ServiceError('Not a JSON', 400)
+    user = _get(user_id)
+    try:
+        if 'username' in data:
+            user.username = data['username']
+        if 'email' in data:
+            user.email = data['email']
+        if 'password_hash' in data:
+            user.password_hash = data['password_hash']
+        storage.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    user_cache.invalidate(user.id)
+    return user.to_dict()
+
+
+def delete_user(user_id):
+    """Deletes a user"""
+    require_role(ADMIN_ROLES)
+    user = _get(user_id)
+    try:
+        storage.delete(user)
+        storage.save()
+    except Exception as e:
+        storage.rollback()
+        raise ServiceError(str(e), 400)
+    user_cache.invalidate(user.id)
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""Conditional GET support based on the updated_at of objects"""
+import hashlib
+from datetime import datetime, timezone
+from flask import Response, jsonify, request
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def make_etag(*parts):
+    """Hashes the parts identifying a representation into
+    an ETag value"""
+    raw = '|'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def http_time(value):
+    """Converts a naive local datetime, or a string in the
+    to_dict format, to the aware UTC time used in HTTP headers"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.strptime(value, TIME_FORMAT)
+    return value.replace(microsecond=0).astimezone(timezone.utc)
+
+
+def version(data):
+    """Returns the version of a serialized object, its updated_at
+    with microseconds when the serializer kept it, so two writes
+    within one second get different ETags"""
+    return getattr(data, 'version', None) or data.get('updated_at')
+
+
+def object_validators(data, *extra):
+    """Returns the ETag and Last-Modified of a serialized object,
+    Last-Modified only has second resolution. The extra parts, e.g.
+    the projected fields, go into the ETag too"""
+    return (make_etag(data.get('id'), version(data), *extra),
+            http_time(data.get('updated_at')))
+
+
+def collection_etag(items, *extra):
+    """Returns the aggregate ETag of a list of serialized objects"""
+    return make_etag(*['{}@{}'.format(item.get('id'), version(item))
+                       for item in items], *extra)
+
+
+def is_fresh(etag, last_modified=None):
+    """Checks if the copy the client holds is still current,
+    If-None-Match takes precedence over If-Modified-Since"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def conditional_response(data, etag, last_modified=None):
+    """Returns 304 Not Modified when the client copy is current,
+    otherwise the JSON data. data may be a callable so the body
+    is only built when it is needed"""
+    if is_fresh(etag, last_modified):
+        response = Response(status=304)
+    else:
+        response = jsonify(data() if callable(data) else data)
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
@@ -7,6 +7,16 @@ from flask_login import current_user
 from models import storage
 from models.user import User
 
+ADMIN_ROLES = ('admin',)
+STAFF_ONE_ROLES = ('staff_one', 'staff_two', 'admin')
+STAFF_TWO_ROLES = ('staff_two', 'admin')
+
+
+def has_role(roles):
+    """Checks if the current user is authenticated and
+    holds one of the passed roles"""
+    return current_user.is_authenticated and current_user.role in roles
+
 
 def admin_required(func):
     """Checks if user is logged in and their role
@@ -16,7 +26,7 @@ def admin_required(func):
         """
         Decorator to check if the current user is an authenticated admin.
         """
-        if not current_user.is_authenticated or current_user.role != 'admin':
+        if not has_role(ADMIN_ROLES):
             abort(403) 
         return func(*args, **kwargs)
     return decorated_view
@@ -30,8 +40,7 @@ def staff_one_required(func):
         """
         Checks if the current user is an authenticated staff.
         """
-        yes = ['staff_one', 'staff_two', 'admin']
-        if not current_user.is_authenticated or current_user.role not in yes:
+        if not has_role(STAFF_ONE_ROLES):
             abort(403)
         return func(*args, **kwargs)
     return decorated_view
@@ -45,8 +54,7 @@ def staff_two_required(func):
         """
         Checks if the current user is an authenticated staff.
         """
-        yes = ['staff_two', 'admin']
-        if not current_user.is_authenticated or current_user.role not in yes:
+        if not has_role(STAFF_TWO_ROLES):
             abort(403)
         return func(*args, **kwargs)
     return decorated_view
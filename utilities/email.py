@@ -1,37 +1,27 @@
 #!/usr/bin/python3
 """Handles email sending"""
-import requests
 from flask import current_app, render_template, flash
+from markupsafe import escape
+
 
 def send_verification_email(to_address, subject, username,
                             verification_token):
-    """Sends a verification email"""
+    """Queues a verification email for the mail dispatcher, the
+    body is the same for every user so the dispatcher can batch
+    them, the user's values go in as recipient variables"""
     try:
-        # Set the Mailgun API key and domain
-        api_key = current_app.config.get('MAILGUN_API_KEY')
         domain = current_app.config.get('MAILGUN_DOMAIN')
         from_email = f"MTS Info <info@{domain}>"
-        mailgun_api_url = f"https://api.mailgun.net/v3/{domain}/messages"
-        rendered_html = render_template('email/verification_email.html',
-                                        username=username,
-                                        verification_token=verification_token)
-
-        response = requests.post(
-            mailgun_api_url,
-            auth=("api", api_key),
-            data={
-                "from": from_email,
-                "to": to_address,
-                "subject": subject,
-                "html": rendered_html
-            }
-        )
-
-        if response.status_code == 200:
-            flash(f"Verification email sent to {to_address} successfully.", 'success')
-        else:
-            flash(f"Failed to send verification email to {to_address}. Status code: {response.status_code}, Response: {response.text}", 'danger')
+        rendered_html = render_template(
+            'email/verification_email.html',
+            username='%recipient.username%',
+            verification_token='%recipient.verification_token%')
+        variables = {'username': str(escape(username)),
+                     'verification_token': str(escape(verification_token))}
+        dispatcher = current_app.extensions['mail_dispatcher']
+        dispatcher.enqueue(from_email, to_address, subject, rendered_html,
+                           variables)
+        flash(f"Verification email to {to_address} queued.", 'success')
 
     except Exception as e:
-        flash(f"An error occurred while sending verification email to {to_address}", 'danger')
-
+        flash(f"An error occurred while queueing verification email to {to_address}", 'danger')
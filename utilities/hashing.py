@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+"""
+    Password hashing on a bounded executor
+
+    Hashes are CPU bound, so they run on a dedicated pool of threads
+    (the hashlib functions release the GIL) or processes instead of
+    the request worker. Admission control caps the hashes running or
+    waiting at once and fails fast with HashingBusy once the cap is
+    reached, so a login burst can't starve every worker.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_EXECUTOR = os.getenv('PASSWORD_HASH_EXECUTOR', 'thread')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS',
+                                      str(os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE',
+                                    str(PASSWORD_HASH_WORKERS * 2)))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool can't take more work"""
+
+
+class HashExecutor:
+    """Runs hashing functions on a pool with at most workers + queue
+    calls admitted at any time"""
+
+    def __init__(self, kind=PASSWORD_HASH_EXECUTOR,
+                 workers=PASSWORD_HASH_WORKERS, queue=PASSWORD_HASH_QUEUE,
+                 timeout=PASSWORD_HASH_TIMEOUT):
+        """Creates an executor, the pool starts on first use"""
+        if kind not in ('thread', 'process'):
+            raise ValueError('Unknown hash executor: {}'.format(kind))
+        self.kind = kind
+        self.workers = workers
+        self.timeout = timeout
+        self.__slots = threading.BoundedSemaphore(workers + queue)
+        self.__pool = None
+        self.__lock = threading.Lock()
+
+    def _pool(self):
+        """Returns the pool, creating it on first use"""
+        with self.__lock:
+            if self.__pool is None:
+                if self.kind == 'process':
+                    # multiprocessing is only imported when used
+                    from concurrent.futures import ProcessPoolExecutor
+                    self.__pool = ProcessPoolExecutor(self.workers)
+                else:
+                    self.__pool = ThreadPoolExecutor(
+                        self.workers, thread_name_prefix='hasher')
+            return self.__pool
+
+    def run(self, func, *args):
+        """Runs func(*args) on the pool and waits for its result,
+        raises HashingBusy right away when the pool is full and
+        when the result takes longer than the timeout"""
+        if not self.__slots.acquire(blocking=False):
+            raise HashingBusy('Password hashing pool is full')
+        try:
+            future = self._pool().submit(func, *args)
+        except Exception:
+            self.__slots.release()
+            raise
+        future.add_done_callback(lambda _: self.__slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HashingBusy('Password hashing timed out')
+
+    def shutdown(self):
+        """Stops the pool"""
+        with self.__lock:
+            if self.__pool is not None:
+                self.__pool.shutdown()
+                self.__pool = None
+
+
+executor = HashExecutor()
+_method_prefix = {}
+
+
+def hash_password(password, method=PASSWORD_HASH_METHOD):
+    """Hashes a password with the configured method"""
+    return executor.run(generate_password_hash, password, method)
+
+
+def verify_password(pwhash, password):
+    """Checks a password against a hash"""
+    return executor.run(check_password_hash, pwhash, password)
+
+
+def _prefix(method):
+    """Returns the method prefix Werkzeug writes in its hashes,
+    it fills in default parameters so let it spell them out"""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def needs_rehash(pwhash, method=PASSWORD_HASH_METHOD):
+    """Checks if a hash was made with other parameters than
+    the configured method. The method prefix is calibrated with
+    one sample hash on the executor, the first time only"""
+    prefix = _method_prefix.get(method)
+    if prefix is None:
+        prefix = _method_prefix[method] = executor.run(_prefix, method)
+    return pwhash.split('$', 1)[0] != prefix
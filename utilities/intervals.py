@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""
+    Sorted interval index
+
+    Keeps [start, end) intervals sorted by start in parallel lists so
+    an overlap check is a binary search: every interval overlapping
+    [start, end) starts before end and no earlier than start minus
+    the longest interval held, recomputed when that one is removed.
+    Used for the appointment calendars of staff members, not thread
+    safe on its own.
+"""
+from bisect import bisect_left, insort
+
+
+class IntervalIndex:
+    """Sorted index of keyed [start, end) intervals"""
+
+    def __init__(self, intervals=()):
+        """Creates an index holding the (key, start, end) intervals"""
+        self.__entries = []
+        self.__intervals = {}
+        self.__longest = None
+        for key, start, end in intervals:
+            self.add(key, start, end)
+
+    def __len__(self):
+        """Returns the number of intervals held"""
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        """Checks if an interval is held under key"""
+        return key in self.__intervals
+
+    def __iter__(self):
+        """Yields the (key, start, end) intervals in start order"""
+        for start, key in self.__entries:
+            yield key, start, self.__intervals[key][1]
+
+    def get(self, key):
+        """Returns the (start, end) interval held under key or None"""
+        return self.__intervals.get(key)
+
+    def add(self, key, start, end):
+        """Adds an interval, replacing the one held under key"""
+        if end <= start:
+            raise ValueError('Interval ends before it starts')
+        self.remove(key)
+        insort(self.__entries, (start, key))
+        self.__intervals[key] = (start, end)
+        if self.__longest is None or end - start > self.__longest:
+            self.__longest = end - start
+
+    def remove(self, key):
+        """Removes the interval held under key, if any"""
+        interval = self.__intervals.pop(key, None)
+        if interval is None:
+            return
+        i = bisect_left(self.__entries, (interval[0], key))
+        del self.__entries[i]
+        if not self.__entries:
+            self.__longest = None
+        elif interval[1] - interval[0] == self.__longest:
+            self.__longest = max(end - begin for begin, end
+                                 in self.__intervals.values())
+
+    def overlapping(self, start, end, ignore=None):
+        """Returns the keys of the intervals overlapping [start, end),
+        other than ignore"""
+        if not self.__entries:
+            return []
+        lo = bisect_left(self.__entries, (start - self.__longest,))
+        hi = bisect_left(self.__entries, (end,))
+        return [key for begin, key in self.__entries[lo:hi]
+                if key != ignore and self.__intervals[key][1] > start]
@@ -0,0 +1,338 @@
+#!/usr/bin/python3
+"""
+    Background dispatcher for outbound email
+
+    Messages are written to a persistent outbox (a local SQLite file)
+    and sent by a pool of worker threads, so request handlers never
+    wait on the mail provider. Workers claim due messages in batches,
+    hand them to a pluggable transport and retry failures with
+    exponential backoff. The outbox is shared safely by every worker
+    process pointing at the same file.
+
+    Messages hold a body template with %recipient.name% placeholders
+    and the per-recipient variables filling them, so messages that
+    only differ by those values, e.g. verification tokens, share a
+    template and go out in one Mailgun call.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+MAIL_WORKERS = int(os.getenv('MAIL_WORKERS', '2'))
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', '50'))
+MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', '6'))
+MAIL_BACKOFF = float(os.getenv('MAIL_BACKOFF', '5'))
+MAIL_POLL_INTERVAL = float(os.getenv('MAIL_POLL_INTERVAL', '5'))
+MAIL_TIMEOUT = float(os.getenv('MAIL_TIMEOUT', '10'))
+PLACEHOLDER = re.compile(r'%recipient\.(\w+)%')
+
+
+def render(message):
+    """Returns the body of a message with its recipient
+    variables substituted"""
+    variables = json.loads(message.get('variables') or '{}')
+    return PLACEHOLDER.sub(
+        lambda match: str(variables.get(match.group(1), match.group(0))),
+        message['html'])
+
+
+class MailError(Exception):
+    """Raised by transports, retryable tells if sending the
+    message again later may succeed"""
+
+    def __init__(self, message, retryable=True):
+        """Stores the error message and if it is retryable"""
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class MailgunTransport:
+    """Sends messages through the Mailgun HTTP API, messages sharing
+    sender, subject and body template go out in a single batch call,
+    Mailgun filling in the variables of every recipient"""
+
+    def __init__(self, api_key, domain, timeout=MAIL_TIMEOUT):
+        """Stores the Mailgun credentials"""
+        self.api_key = api_key
+        self.domain = domain
+        self.timeout = timeout
+
+    def send_batch(self, messages):
+        """Sends messages and returns a list of (message, error)
+        pairs where error is None for delivered messages"""
+        groups = {}
+        for message in messages:
+            key = (message['sender'], message['subject'], message['html'])
+            batches = groups.setdefault(key, [])
+            # A recipient has one set of variables per call
+            for batch in batches:
+                if message['recipient'] not in batch:
+                    break
+            else:
+                batch = {}
+                batches.append(batch)
+            batch[message['recipient']] = message
+        results = []
+        for (sender, subject, html), batches in groups.items():
+            for batch in batches:
+                error = self._post(sender, subject, html, {
+                    recipient: json.loads(message.get('variables') or '{}')
+                    for recipient, message in batch.items()})
+                results.extend((message, error)
+                               for message in batch.values())
+        return results
+
+    def _post(self, sender, subject, html, recipients):
+        """Posts one message to the recipients, a dict of their
+        variables, returns a MailError on failure"""
+        import requests
+
+        url = 'https://api.mailgun.net/v3/{}/messages'.format(self.domain)
+        # Recipient variables also keep every recipient from
+        # seeing the others
+        data = {'from': sender, 'to': list(recipients),
+                'subject': subject, 'html': html,
+                'recipient-variables': json.dumps(recipients)}
+        try:
+            response = requests.post(url, auth=('api', self.api_key),
+                                     data=data, timeout=self.timeout)
+        except requests.RequestException as e:
+            return MailError(str(e))
+        if response.status_code == 200:
+            return None
+        retryable = response.status_code == 429 or \
+            response.status_code >= 500
+        return MailError('Status code: {}, Response: {}'.format(
+            response.status_code, response.text), retryable)
+
+
+class StubTransport:
+    """Keeps messages in memory instead of sending them,
+    for tests and local development"""
+
+    def __init__(self):
+        """Creates an empty outbox"""
+        self.sent = []
+
+    def send_batch(self, messages):
+        """Records messages as delivered, with their variables
+        filled in"""
+        self.sent.extend(dict(message, html=render(message))
+                         for message in messages)
+        return [(message, None) for message in messages]
+
+
+class MailQueue:
+    """Persistent outbox of messages waiting to be sent"""
+
+    def __init__(self, path):
+        """Opens, and creates when needed, the outbox at path"""
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False,
+                                    isolation_level=None, timeout=30)
+        self.__db.row_factory = sqlite3.Row
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT NOT NULL, '
+            'recipient TEXT NOT NULL, subject TEXT NOT NULL, '
+            "html TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', "
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'next_attempt REAL NOT NULL, claimed_at REAL, last_error TEXT, '
+            'variables TEXT)')
+        columns = [row['name'] for row in
+                   self.__db.execute('PRAGMA table_info(outbox)')]
+        if 'variables' not in columns:
+            self.__db.execute('ALTER TABLE outbox ADD COLUMN variables TEXT')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS ix_outbox_due '
+                          'ON outbox (status, next_attempt)')
+
+    def put(self, sender, recipient, subject, html, variables=None):
+        """Adds a message to the outbox and returns its id, html may
+        hold %recipient.name% placeholders for the variables"""
+        with self.__lock:
+            cursor = self.__db.execute(
+                'INSERT INTO outbox (sender, recipient, subject, html, '
+                'variables, next_attempt) VALUES (?, ?, ?, ?, ?, ?)',
+                (sender, recipient, subject, html,
+                 json.dumps(variables or {}), time.time()))
+            return cursor.lastrowid
+
+    def claim(self, limit, stale_after=300):
+        """Atomically claims up to limit due messages, messages
+        claimed by a worker that died are claimed again after
+        stale_after seconds"""
+        now = time.time()
+        with self.__lock:
+            self.__db.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self.__db.execute(
+                    "SELECT * FROM outbox WHERE (status = 'pending' AND "
+                    "next_attempt <= ?) OR (status = 'sending' AND "
+                    "claimed_at < ?) ORDER BY next_attempt LIMIT ?",
+                    (now, now - stale_after, limit)).fetchall()
+                self.__db.executemany(
+                    "UPDATE outbox SET status = 'sending', claimed_at = ? "
+                    "WHERE id = ?", [(now, row['id']) for row in rows])
+                self.__db.execute('COMMIT')
+            except Exception:
+                self.__db.execute('ROLLBACK')
+                raise
+        return [dict(row) for row in rows]
+
+    def done(self, message_id):
+        """Removes a delivered message"""
+        with self.__lock:
+            self.__db.execute('DELETE FROM outbox WHERE id = ?',
+                              (message_id,))
+
+    def retry(self, message, error, max_attempts, backoff):
+        """Reschedules a failed message with exponential backoff, or
+        marks it failed once it is out of attempts"""
+        attempts = message['attempts'] + 1
+        if not getattr(error, 'retryable', True) or \
+                attempts >= max_attempts:
+            status, next_attempt = 'failed', time.time()
+        else:
+            status = 'pending'
+            next_attempt = time.time() + backoff * 2 ** (attempts - 1)
+        with self.__lock:
+            self.__db.execute(
+                'UPDATE outbox SET status = ?, attempts = ?, '
+                'next_attempt = ?, last_error = ? WHERE id = ?',
+                (status, attempts, next_attempt, str(error), message['id']))
+
+    def next_due(self):
+        """Returns when the next pending message is due, or None"""
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT MIN(next_attempt) FROM outbox "
+                "WHERE status = 'pending'").fetchone()
+            return row[0]
+
+    def unsent(self):
+        """Counts the messages waiting to be sent, including the
+        ones a stopped process had claimed"""
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT COUNT(*) FROM outbox "
+                "WHERE status IN ('pending', 'sending')").fetchone()
+            return row[0]
+
+    def stats(self):
+        """Counts messages by status"""
+        with self.__lock:
+            rows = self.__db.execute(
+                'SELECT status, COUNT(*) FROM outbox GROUP BY status')
+            return dict(rows.fetchall())
+
+
+class MailDispatcher:
+    """Pool of worker threads draining a MailQueue through
+    a transport"""
+
+    def __init__(self, queue, transport, workers=MAIL_WORKERS,
+                 batch_size=MAIL_BATCH_SIZE, max_attempts=MAIL_MAX_ATTEMPTS,
+                 backoff=MAIL_BACKOFF, poll_interval=MAIL_POLL_INTERVAL):
+        """Creates a stopped dispatcher"""
+        self.queue = queue
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.__wakeup = threading.Event()
+        self.__stopping = threading.Event()
+        self.__threads = []
+        self.__lock = threading.Lock()
+
+    def start(self):
+        """Starts the worker threads once"""
+        with self.__lock:
+            if self.__threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name='mail-worker-{}'.format(i))
+                thread.start()
+                self.__threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Stops the worker threads after their current batch"""
+        self.__stopping.set()
+        self.__wakeup.set()
+        for thread in self.__threads:
+            thread.join(timeout)
+
+    def enqueue(self, sender, recipient, subject, html, variables=None):
+        """Queues a message and wakes the workers up"""
+        message_id = self.queue.put(sender, recipient, subject, html,
+                                    variables)
+        self.start()
+        self.__wakeup.set()
+        return message_id
+
+    def dispatch_once(self):
+        """Sends one batch of due messages and returns how many
+        messages were processed"""
+        messages = self.queue.claim(self.batch_size)
+        if not messages:
+            return 0
+        try:
+            results = self.transport.send_batch(messages)
+        except Exception as e:
+            results = [(message, e) for message in messages]
+        for message, error in results:
+            if error is None:
+                self.queue.done(message['id'])
+            else:
+                self.queue.retry(message, error, self.max_attempts,
+                                 self.backoff)
+        return len(messages)
+
+    def _work(self):
+        """Worker loop, when there is nothing due it sleeps until
+        woken up, the next retry is due or the poll interval passes"""
+        while not self.__stopping.is_set():
+            try:
+                processed = self.dispatch_once()
+                next_due = self.queue.next_due()
+            except Exception:
+                processed, next_due = 0, None
+            if not processed:
+                timeout = self.poll_interval
+                if next_due is not None:
+                    timeout = min(max(next_due - time.time(), 0), timeout)
+                self.__wakeup.wait(timeout)
+                self.__wakeup.clear()
+
+
+def transport_from_config(config):
+    """Builds the transport named by the MAIL_TRANSPORT setting"""
+    name = config.get('MAIL_TRANSPORT') or 'mailgun'
+    if name == 'stub':
+        return StubTransport()
+    if name == 'mailgun':
+        return MailgunTransport(config.get('MAILGUN_API_KEY'),
+                                config.get('MAILGUN_DOMAIN'),
+                                config.get('MAIL_TIMEOUT', MAIL_TIMEOUT))
+    raise ValueError('Unknown mail transport: {}'.format(name))
+
+
+def init_mail(app):
+    """Attaches a mail dispatcher to the app, its workers start
+    right away when a previous process left unsent messages in
+    the outbox, otherwise with the first queued message"""
+    path = app.config.get('MAIL_QUEUE_PATH') or \
+        os.path.join(app.instance_path, 'mail_queue.db')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    dispatcher = MailDispatcher(MailQueue(path),
+                                transport_from_config(app.config))
+    app.extensions['mail_dispatcher'] = dispatcher
+    if dispatcher.queue.unsent():
+        dispatcher.start()
+    return dispatcher
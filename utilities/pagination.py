@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+"""Handles pagination and other integer parameters of the
+list endpoints"""
+from flask import abort, request
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def int_arg(name, default):
+    """Reads an integer from the query string, default when it
+    is missing, a value that isn't an integer is a 400 rather
+    than silently the default"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, 'Invalid {}'.format(name))
+
+
+def page_args():
+    """Reads the limit and after cursor from the query string,
+    clamping limit between 1 and MAX_LIMIT, a limit that isn't a
+    positive integer is a 400"""
+    limit = int_arg('limit', DEFAULT_LIMIT)
+    if limit < 1:
+        abort(400, 'Invalid limit')
+    return min(limit, MAX_LIMIT), request.args.get('after')
+
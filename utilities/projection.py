@@ -0,0 +1,15 @@
+#!/usr/bin/python3
+"""Handles the ?fields= sparse fieldset parameter of the read
+endpoints"""
+from flask import request
+
+
+def fields_arg():
+    """Reads the comma separated field names from the query string,
+    sorted so they can key ETags, None when the client wants every
+    field"""
+    fields = request.args.get('fields')
+    if fields is None:
+        return None
+    fields = {field.strip() for field in fields.split(',')}
+    return sorted(field for field in fields if field) or None
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""
+    Per request SQL instrumentation
+
+    Cursor execution events of the storage engines are timed and added
+    up per request: the query count and db time go out in a
+    Server-Timing header and a JSON log line, slow statements are
+    logged on their own. A view may declare a query budget with
+    @query_budget(n), or SQL_QUERY_BUDGET sets one for every view;
+    going over it raises QueryBudgetExceeded in debug mode and logs
+    a warning otherwise, so N+1 regressions show up early.
+"""
+import json
+import logging
+import os
+import time
+from collections import Counter
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SQL_SLOW_MS = float(os.getenv('SQL_SLOW_MS', '100'))
+SQL_QUERY_BUDGET = int(os.getenv('SQL_QUERY_BUDGET', '0'))
+SQL_LOG_STATEMENT_LENGTH = 300
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in debug mode when a view runs more queries
+    than its budget"""
+
+
+def query_budget(limit):
+    """Decorator declaring the most queries a view may run"""
+    def decorator(func):
+        """Tags the view with its budget"""
+        @wraps(func)
+        def decorated_view(*args, **kwargs):
+            """Runs the view"""
+            return func(*args, **kwargs)
+        decorated_view.query_budget = limit
+        return decorated_view
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    """Stamps the start of a statement"""
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    """Adds a statement to the stats of the current request"""
+    elapsed = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+    if not has_request_context() or 'sql_stats' not in g:
+        return
+    stats = g.sql_stats
+    stats['queries'] += 1
+    stats['db_ms'] += elapsed
+    stats['statements'][statement] += 1
+    if elapsed >= SQL_SLOW_MS:
+        stats['slow'].append((statement, elapsed))
+
+
+def _handle_error(context):
+    """Drops the start stamp of a failed statement"""
+    if context.connection is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+def _start_request():
+    """Starts collecting the stats of a request"""
+    g.sql_stats = {'started': time.perf_counter(), 'queries': 0,
+                   'db_ms': 0.0, 'statements': Counter(), 'slow': []}
+
+
+def _budget():
+    """Returns the query budget of the current view, 0 for none"""
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'query_budget', SQL_QUERY_BUDGET)
+
+
+def _finish_request(response):
+    """Reports the stats of a request"""
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    total_ms = (time.perf_counter() - stats['started']) * 1000
+    response.headers.add('Server-Timing',
+                         'db;dur={:.2f};desc="{} queries", app;dur={:.2f}'
+                         .format(stats['db_ms'], stats['queries'], total_ms))
+    logger.info(json.dumps({
+        'method': request.method, 'path': request.path,
+        'endpoint': request.endpoint, 'status': response.status_code,
+        'duration_ms': round(total_ms, 2), 'db_queries': stats['queries'],
+        'db_ms': round(stats['db_ms'], 2)}))
+    for statement, elapsed in stats['slow']:
+        logger.warning(json.dumps({
+            'slow_query_ms': round(elapsed, 2), 'endpoint': request.endpoint,
+            'statement': statement[:SQL_LOG_STATEMENT_LENGTH]}))
+    budget = _budget()
+    if budget and stats['queries'] > budget:
+        repeated = ['{} x {}'.format(count,
+                                     statement[:SQL_LOG_STATEMENT_LENGTH])
+                    for statement, count in
+                    stats['statements'].most_common(3)]
+        message = '{} ran {} queries, over its budget of {}: {}'.format(
+            request.endpoint, stats['queries'], budget, '; '.join(repeated))
+        if current_app.debug:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def init_query_metrics(app, *engines):
+    """Instruments the engines, every engine when none are passed
+    so they can be created after the app, and reports per request
+    stats for the app"""
+    for engine in engines or [Engine]:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""Streams large collections as a JSON array or NDJSON"""
+from flask import (Response, abort, current_app, request,
+                   stream_with_context)
+
+FORMATS = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+ROWS_PER_CHUNK = 100
+
+
+def stream_format():
+    """Returns the requested streaming format, json or ndjson,
+    or None when the client wants a regular paged response"""
+    fmt = request.args.get('stream')
+    if fmt is None and \
+            request.accept_mimetypes.best == FORMATS['ndjson']:
+        fmt = 'ndjson'
+    if fmt is not None and fmt not in FORMATS:
+        abort(400, 'Invalid stream format')
+    return fmt
+
+
+def _chunks(items, fmt):
+    """Encodes items and groups them ROWS_PER_CHUNK at a time"""
+    dumps = current_app.json.dumps
+    separator = '\n' if fmt == 'ndjson' else ','
+    first = True
+    chunk = []
+    for item in items:
+        chunk.append(dumps(item))
+        if len(chunk) == ROWS_PER_CHUNK:
+            yield first, separator.join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield first, separator.join(chunk)
+
+
+def stream_response(items, fmt):
+    """Builds a response that writes items as they are produced
+    so memory stays constant however many there are"""
+    def generate():
+        """Yields the encoded body piece by piece"""
+        if fmt == 'ndjson':
+            for _, chunk in _chunks(items, fmt):
+                yield chunk + '\n'
+            return
+        yield '['
+        for first, chunk in _chunks(items, fmt):
+            yield chunk if first else ',' + chunk
+        yield ']'
+    return Response(stream_with_context(generate()),
+                    mimetype=FORMATS[fmt])
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""
+    Bounded TTL/LRU cache of authenticated user principals
+
+    Flask-Login loads the user on every authenticated request, the
+    cache keeps the few fields the app needs from it (id, username,
+    email, role and verified) so most requests skip that query.
+    Entries are dropped when a user changes and expire after the TTL,
+    which bounds how stale a principal can get in other worker
+    processes, e.g. after a role is changed in the db.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask_login import UserMixin
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '1024'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+
+
+class Principal(UserMixin):
+    """Read only snapshot of an authenticated user"""
+
+    def __init__(self, user):
+        """Copies the principal fields of a User"""
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.role = user.role
+        self.verified = user.verified
+
+    def get_id(self):
+        """Returns the user object id"""
+        return str(self.id)
+
+
+class UserCache:
+    """Thread safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        """Creates an empty cache"""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, user_id):
+        """Returns the cached principal of a user or None"""
+        with self.__lock:
+            entry = self.__entries.get(user_id)
+            if entry is None:
+                return None
+            principal, expires = entry
+            if expires < time.monotonic():
+                del self.__entries[user_id]
+                return None
+            self.__entries.move_to_end(user_id)
+            return principal
+
+    def put(self, user):
+        """Caches and returns the principal of a User"""
+        principal = Principal(user)
+        with self.__lock:
+            self.__entries[principal.id] = (principal,
+                                            time.monotonic() + self.ttl)
+            self.__entries.move_to_end(principal.id)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id):
+        """Drops the cached principal of a user"""
+        with self.__lock:
+            self.__entries.pop(str(user_id), None)
+
+    def clear(self):
+        """Drops every cached principal"""
+        with self.__lock:
+            self.__entries.clear()
+
+
+user_cache = UserCache()